@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# (C) 2017 David Toro <davsamirtor@gmail.com>
+
+# compatibility with python 2 and 3
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+from builtins import object
+
+# import build-in modules
+from collections import defaultdict
+
+# import third party modules
+import numpy as np
+
+# special variables
+# __all__ = []
+__author__ = "David Toro"
+# __copyright__ = "Copyright 2017, The <name> Project"
+# __credits__ = [""]
+__license__ = "GPL"
+# __version__ = "1.0.0"
+__maintainer__ = "David Toro"
+__email__ = "davsamirtor@gmail.com"
+# __status__ = "Pre-release"
+
+
+def reach_of(tail_item, margin=2.):
+    """
+    get the region of influence of a tail item as a square around
+    its enclosing circle.
+
+    Two tail items can only be inside or near each other (see
+    TailItem.point_inside and TailItem.cnt_near) if their reaches
+    overlap, that is, if the distance between the centres of their
+    enclosing circles is less than 1.5 times the sum of their radii.
+
+    :param tail_item: TailItem object
+    :param margin: pixels added to cover truncated points
+    :return: x_min, y_min, x_max, y_max
+    """
+    (x, y), r = tail_item.enclosing_circle()
+    reach = 1.5 * r + margin
+    return x - reach, y - reach, x + reach, y + reach
+
+
+class Association(object):
+    """
+    Brute force association engine where every detection is tested
+    against every indexed object. Engines are rebuilt once per frame
+    with the objects to associate and are asked for the candidates
+    of each detection, which must be given in the same order as they
+    were indexed.
+    """
+
+    def __init__(self):
+        self.keys = []
+        self.items = []
+
+    def build(self, keys, tail_items):
+        """
+        index the objects of a frame
+
+        :param keys: objects to associate
+        :param tail_items: last tail item of each object
+        """
+        self.keys = list(keys)
+        self.items = list(tail_items)
+
+    def candidates(self, tail_item):
+        """
+        get the objects that could be associated with a tail item
+
+        :param tail_item: detected TailItem
+        :return: list of (key, tail_item) in indexed order
+        """
+        return list(zip(self.keys, self.items))
+
+    def __len__(self):
+        return len(self.keys)
+
+
+class GridAssociation(Association):
+    """
+    Association engine that bins the reach of every object in a
+    uniform grid so that each detection is only tested against the
+    objects in the cells it touches.
+    """
+
+    def __init__(self, cell_size=None, margin=2.):
+        """
+        :param cell_size: size of the grid cells in pixels. If None it is
+            the median reach of the objects of each frame.
+        :param margin: pixels added to each reach to cover truncated points
+        """
+        super(GridAssociation, self).__init__()
+        self.cell_size = cell_size
+        self.margin = margin
+        self._cell = 1.
+        self._grid = {}
+
+    def _cells(self, reach):
+        cell = self._cell
+        x0, y0, x1, y1 = reach
+        return (int(np.floor(x0 / cell)), int(np.floor(y0 / cell)),
+                int(np.floor(x1 / cell)), int(np.floor(y1 / cell)))
+
+    def build(self, keys, tail_items):
+        super(GridAssociation, self).build(keys, tail_items)
+        reaches = [reach_of(i, self.margin) for i in self.items]
+        cell = self.cell_size
+        if cell is None:
+            if reaches:
+                sizes = np.array(reaches)
+                cell = np.median(sizes[:, 2] - sizes[:, 0])
+            cell = max(cell or 1., 1.)
+        self._cell = float(cell)
+
+        grid = defaultdict(list)
+        for index, reach in enumerate(reaches):
+            cx0, cy0, cx1, cy1 = self._cells(reach)
+            for cx in range(cx0, cx1 + 1):
+                for cy in range(cy0, cy1 + 1):
+                    grid[(cx, cy)].append(index)
+        self._grid = grid
+
+    def candidates(self, tail_item):
+        grid = self._grid
+        if not grid:
+            return []
+        cx0, cy0, cx1, cy1 = self._cells(reach_of(tail_item, self.margin))
+        found = set()
+        for cx in range(cx0, cx1 + 1):
+            for cy in range(cy0, cy1 + 1):
+                found.update(grid.get((cx, cy), ()))
+        keys, items = self.keys, self.items
+        return [(keys[i], items[i]) for i in sorted(found)]
+
+
+def associate(engine, tail_items):
+    """
+    classify detected tail items against the objects indexed in an
+    association engine.
+
+    A tail item belongs to the first object (in indexed order) that
+    contains its point or whose point it contains, otherwise it is
+    flagged if it is near any of the objects.
+
+    :param engine: built Association engine
+    :param tail_items: detected TailItem objects
+    :return: list of (key, near) for each tail item where key is the
+        object containing the tail item or None. near is only evaluated
+        for the tail items without object.
+    """
+    classified = []
+    for ti in tail_items:
+        candidates = engine.candidates(ti)
+        for key, item in candidates:
+            # find out if cnt overlaps with objects
+            # faster check
+            if item.point_inside(ti) or ti.point_inside(item):
+                # tail_item inside Object or Object inside tail_item
+                classified.append((key, False))
+                break
+        else:
+            # it is near an object do not create new
+            near_flag = bool(candidates) and bool(
+                ti.cnt_near_many([item for _, item in candidates])[0].any())
+            classified.append((None, near_flag))
+    return classified
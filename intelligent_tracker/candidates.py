@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# (C) 2017 David Toro <davsamirtor@gmail.com>
+
+# compatibility with python 2 and 3
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+from builtins import object
+
+# import build-in modules
+
+# import third party modules
+import numpy as np
+
+# special variables
+# __all__ = []
+__author__ = "David Toro"
+# __copyright__ = "Copyright 2017, The <name> Project"
+# __credits__ = [""]
+__license__ = "GPL"
+# __version__ = "1.0.0"
+__maintainer__ = "David Toro"
+__email__ = "davsamirtor@gmail.com"
+# __status__ = "Pre-release"
+
+
+def overlaps(bbox, bboxes):
+    """
+    intersection over union of a bounding box with many
+
+    :param bbox: bounding box (x, y, w, h)
+    :param bboxes: array of bounding boxes with shape (n, 4)
+    :return: array of n overlaps between 0 and 1
+    """
+    x, y, w, h = bbox
+    bx, by, bw, bh = bboxes.T
+    iw = np.minimum(x + w, bx + bw) - np.maximum(x, bx)
+    ih = np.minimum(y + h, by + bh) - np.maximum(y, by)
+    inter = np.clip(iw, 0, None) * np.clip(ih, 0, None)
+    union = w * h + bw * bh - inter
+    return inter / np.maximum(union, 1e-9)
+
+
+class CandidateBuffer(object):
+    """
+    Probation of the new detections of a Detector before they become
+    Objects.
+
+    A candidate is kept as a row of plain arrays (bounding box, hits,
+    first and last frame where it was seen) and only the tail item of
+    its last detection. It is promoted when it is detected in
+    confirmations of the first frames after it appeared, otherwise it
+    expires and no Object is created for it.
+    """
+
+    def __init__(self, confirmations=3, frames=5, overlap=0.3):
+        """
+        :param confirmations: detections (K) to promote a candidate
+        :param frames: frames (M) a candidate has to be confirmed
+            since it appeared
+        :param overlap: minimum intersection over union of a detection
+            with a candidate to confirm it
+        """
+        if confirmations < 1 or frames < confirmations:
+            raise ValueError("confirmations must be between 1 and frames "
+                             "but got {} in {} frames".format(
+                                 confirmations, frames))
+        self.confirmations = confirmations
+        self.frames = frames
+        self.overlap = overlap
+        self.frame = 0  # frames given to update
+        self.bbox = np.zeros((0, 4), np.float64)
+        self.hits = np.zeros(0, np.int64)
+        self.first_seen = np.zeros(0, np.int64)
+        self.last_seen = np.zeros(0, np.int64)
+        self._items = []  # last tail item of each candidate
+        # statistics
+        self.detections = 0  # detections given to update
+        self.promoted = 0  # candidates promoted to objects
+        self.expired = 0  # candidates that never became objects
+
+    def __len__(self):
+        return len(self._items)
+
+    @property
+    def rejection_rate(self):
+        """
+        :return: fraction of the resolved candidates that expired, that
+            is the objects that were not created
+        """
+        total = self.promoted + self.expired
+        if not total:
+            return 0.
+        return self.expired / total
+
+    def update(self, tail_items):
+        """
+        register the new detections of a frame. Call it once per frame
+        even if there are no detections so that candidates expire.
+
+        :param tail_items: tail items that are not of any object
+        :return: tail items of the promoted candidates in the order
+            they appeared
+        """
+        self.frame += 1
+        frame = self.frame
+        bboxes, hits = self.bbox, self.hits
+        seen = np.zeros(len(bboxes), bool)  # confirmed in this frame
+        items = self._items
+        new = []
+        for ti in tail_items:
+            bbox = ti.bbox
+            if len(bboxes):
+                iou = overlaps(bbox, bboxes)
+                iou[seen] = -1  # one detection per candidate and frame
+                i = int(np.argmax(iou))
+                if iou[i] >= self.overlap:
+                    seen[i] = True
+                    bboxes[i] = bbox
+                    hits[i] += 1
+                    items[i] = ti
+                    continue
+            new.append(ti)
+        self.detections += len(tail_items)
+        self.last_seen[seen] = frame
+
+        if new:
+            no_new = len(new)
+            bboxes = self.bbox = np.vstack(
+                [bboxes, np.array([ti.bbox for ti in new], np.float64)])
+            hits = self.hits = np.concatenate(
+                [hits, np.ones(no_new, np.int64)])
+            self.first_seen = np.concatenate(
+                [self.first_seen, np.full(no_new, frame, np.int64)])
+            self.last_seen = np.concatenate(
+                [self.last_seen, np.full(no_new, frame, np.int64)])
+            items.extend(new)
+
+        promote = hits >= self.confirmations
+        expire = ~promote & (frame - self.first_seen + 1 >= self.frames)
+        promoted = [items[i] for i in np.flatnonzero(promote)]
+        self.promoted += len(promoted)
+        self.expired += int(np.count_nonzero(expire))
+        if promoted or expire.any():
+            keep = ~(promote | expire)
+            self.bbox, self.hits = bboxes[keep], hits[keep]
+            self.first_seen = self.first_seen[keep]
+            self.last_seen = self.last_seen[keep]
+            self._items = [items[i] for i in np.flatnonzero(keep)]
+        return promoted
+
+    def clear(self):
+        """
+        drop all the candidates
+        """
+        self.bbox = self.bbox[:0]
+        self.hits = self.hits[:0]
+        self.first_seen = self.first_seen[:0]
+        self.last_seen = self.last_seen[:0]
+        self._items = []
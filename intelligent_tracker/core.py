@@ -16,15 +16,21 @@ import gc
 import sys
 from abc import ABCMeta
 from functools import wraps
+from bisect import bisect_left, insort
 from threading import RLock
 from ordered_set import OrderedSet
-from collections import MutableMapping, MutableSet, namedtuple, OrderedDict, deque
-from weakref import ref, WeakValueDictionary, KeyedRef, _IterationGuard  # https://stackoverflow.com/a/36788452/5288758
+from collections import (MutableMapping, MutableSet, namedtuple, OrderedDict,
+                         deque)
+try:
+    from collections.abc import KeysView, ValuesView, ItemsView
+except ImportError:
+    # python 2
+    from collections import KeysView, ValuesView, ItemsView
+from weakref import ref, proxy, WeakValueDictionary, KeyedRef, _IterationGuard  # https://stackoverflow.com/a/36788452/5288758
 
 # import third party modules
 from .geometry import cnt_check_intersection
 from combomethod import combomethod  # https://stackoverflow.com/q/2589690/5288758
-from scipy.spatial.distance import euclidean
 import numpy as np
 import cv2
 (cv_major_ver, cv_minor_ver, cv_subminor_ver) = cv2.__version__.split('.')
@@ -59,15 +65,23 @@ class SpaceHandle(MutableMapping):
     # https://stackoverflow.com/a/3387975/5288758
 
     def __init__(self, parent, handle):
-        self.parent = parent
+        # the parent keeps the handle, so it is referenced weakly to not
+        # create a reference cycle that only the garbage collector frees
+        self._parent = ref(parent)
         self.handle = handle
 
+    @property
+    def parent(self):
+        return self._parent()
+
     def change_name(self, old_name, new_name, obj):
         self.handle[new_name] = self.handle.pop(old_name)
 
     def remove_name(self, name):
         #self.handle.pop(name)
-        self.parent._space_remove_child(self.handle[name]())
+        parent = self.parent
+        if parent is not None:
+            parent._space_remove_child(self.handle[name]())
 
     def __getitem__(self, key):
         return self.handle[self.__keytransform__(key)]
@@ -301,6 +315,312 @@ class WeakRefDictionary(WeakWatcherDictionary):
             return wr
 
 
+class _TrieNode(object):
+    """
+    node of a HierarchyTrie
+    """
+    __slots__ = ('segment', 'parent', 'children', 'segments', 'entity',
+                 '__weakref__')
+
+    def __init__(self, segment, parent=None):
+        self.segment = segment  # name in the hierarchy
+        self.parent = None if parent is None else ref(parent)
+        self.children = {}  # segment and node
+        self.segments = None  # sorted segments of children when needed
+        self.entity = None  # weak reference of the object in this node
+
+    def path(self):
+        """
+        :return: hierarchy of the node
+        """
+        segments = []
+        node = self
+        while node.parent is not None:
+            segments.append(node.segment)
+            node = node.parent()
+        return ".".join(reversed(segments))
+
+
+class HierarchyTrie(MutableMapping):
+    """
+    Mapping of the hierarchies of the Space objects kept by their
+    segments separated by ".", to look them up with wildcards without
+    scanning all the hierarchies.
+
+    Each node only knows its segment and its parent, so the complete
+    hierarchies are built when they are iterated and moving a
+    hierarchy does not depend on how many hierarchies are under it.
+    Objects are referenced weakly and removed when they are freed.
+    """
+
+    def __init__(self):
+        self._root = _TrieNode(None)
+        self._by_name = {}  # last segment and the nodes that end with it
+        # sorted reversed segments of _by_name to look up their ends
+        self._suffixes = []
+        self._len = 0  # nodes with objects
+
+    def __len__(self):
+        return self._len
+
+    def _find(self, hierarchy):
+        node = self._root
+        for segment in hierarchy.split("."):
+            node = node.children.get(segment)
+            if node is None:
+                return None
+        return node
+
+    def _attach(self, parent, segment, node=None):
+        """
+        put a node (or a new one) under parent as segment
+        """
+        if node is None:
+            node = _TrieNode(segment, parent)
+        else:
+            node.segment, node.parent = segment, ref(parent)
+        parent.children[segment] = node
+        parent.segments = None
+        nodes = self._by_name.get(segment)
+        if nodes is None:
+            nodes = self._by_name[segment] = set()
+            insort(self._suffixes, segment[::-1])
+        nodes.add(node)
+        return node
+
+    def _detach(self, node):
+        """
+        remove a node from its parent
+        """
+        parent = node.parent()
+        del parent.children[node.segment]
+        parent.segments = None
+        nodes = self._by_name[node.segment]
+        nodes.discard(node)
+        if not nodes:
+            del self._by_name[node.segment]
+            suffixes = self._suffixes
+            del suffixes[bisect_left(suffixes, node.segment[::-1])]
+        return parent
+
+    def _prune(self, node):
+        """
+        remove the nodes without objects nor children from node upwards
+        """
+        while (node.parent is not None and node.entity is None and
+               not node.children):
+            node = self._detach(node)
+
+    def _make(self, hierarchy):
+        node = self._root
+        for segment in hierarchy.split("."):
+            child = node.children.get(segment)
+            if child is None:
+                child = self._attach(node, segment)
+            node = child
+        return node
+
+    def _set_entity(self, node, obj):
+        if node.entity is None:
+            self._len += 1
+
+        def collected(wr, selfref=ref(self), node=ref(node)):
+            self, node = selfref(), node()
+            if self is not None and node is not None and node.entity is wr:
+                self._clear(node)
+
+        node.entity = ref(obj, collected)
+
+    def _clear(self, node):
+        node.entity = None
+        self._len -= 1
+        self._prune(node)
+
+    def add(self, hierarchy, obj):
+        """
+        register an object in a hierarchy, replacing the object that
+        was there
+
+        :param hierarchy: string of hierarchy
+        :param obj: Space object
+        """
+        self._set_entity(self._make(hierarchy), obj)
+
+    def get(self, hierarchy, default=None):
+        """
+        :param hierarchy: string of hierarchy
+        :return: object in hierarchy or default
+        """
+        node = self._find(hierarchy)
+        if node is None or node.entity is None:
+            return default
+        obj = node.entity()
+        return default if obj is None else obj
+
+    def __contains__(self, hierarchy):
+        return self.get(hierarchy) is not None
+
+    def __getitem__(self, hierarchy):
+        obj = self.get(hierarchy)
+        if obj is None:
+            raise KeyError(hierarchy)
+        return obj
+
+    def __setitem__(self, hierarchy, obj):
+        self.add(hierarchy, obj)
+
+    def __delitem__(self, hierarchy):
+        node = self._find(hierarchy)
+        if node is None or node.entity is None:
+            raise KeyError(hierarchy)
+        self._clear(node)
+
+    def __iter__(self):
+        for hierarchy, _ in self._walk(self._root, ""):
+            yield hierarchy
+
+    def discard(self, hierarchy, obj=None):
+        """
+        unregister the object of a hierarchy
+
+        :param hierarchy: string of hierarchy
+        :param obj: only unregister if this is the object in hierarchy
+        """
+        node = self._find(hierarchy)
+        if node is None or node.entity is None:
+            return
+        if obj is None or node.entity() is obj:
+            self._clear(node)
+
+    def move(self, old_hierarchy, new_hierarchy):
+        """
+        move a hierarchy and all the hierarchies under it. This only
+        costs the size of the moved hierarchies if new_hierarchy has
+        hierarchies under it already
+
+        :param old_hierarchy: string of hierarchy
+        :param new_hierarchy: string of hierarchy to move to
+        """
+        node = self._find(old_hierarchy)
+        if node is None or old_hierarchy == new_hierarchy:
+            return
+        old_parent = self._detach(node)
+        parent_path, _, segment = new_hierarchy.rpartition(".")
+        parent = self._make(parent_path) if parent_path else self._root
+        target = parent.children.get(segment)
+        if target is None:
+            self._attach(parent, segment, node)
+        else:
+            self._merge(node, target)
+        self._prune(old_parent)
+
+    def _merge(self, node, target):
+        """
+        move the object and children of node into target
+        """
+        if node.entity is not None:
+            obj = node.entity()
+            node.entity = None
+            self._len -= 1
+            if obj is not None:
+                self._set_entity(target, obj)
+        for segment, child in list(node.children.items()):
+            self._detach(child)
+            other = target.children.get(segment)
+            if other is None:
+                self._attach(target, segment, child)
+            else:
+                self._merge(child, other)
+
+    def _walk(self, node, path):
+        """
+        iterate the (hierarchy, object) of node and the nodes under it
+        """
+        stack = [(node, path)]
+        while stack:
+            node, path = stack.pop()
+            if node.entity is not None:
+                obj = node.entity()
+                if obj is not None:
+                    yield path, obj
+            for segment, child in node.children.items():
+                stack.append((child, path + "." + segment if path else segment))
+
+    def items(self, hierarchy=None):
+        """
+        :param hierarchy: string of hierarchy. If None the whole Space
+        :return: list of (hierarchy, object) of hierarchy and the ones
+            under it
+        """
+        if hierarchy is None:
+            return list(self._walk(self._root, ""))
+        node = self._find(hierarchy)
+        if node is None:
+            return []
+        return list(self._walk(node, hierarchy))
+
+    def match(self, starts="", ends=""):
+        """
+        find the hierarchies that start and end with strings, like
+        "starts*ends" does in Space._space_get_from_hierarchy.
+
+        If starts is given only the hierarchies under it are visited,
+        otherwise the last segments of the hierarchies are looked up
+        from ends in the sorted reversed segments.
+
+        :param starts: start of the hierarchies
+        :param ends: end of the hierarchies
+        :return: dictionary of hierarchies and objects
+        """
+        found = {}
+        if starts or not ends:
+            # go down the complete segments of starts
+            segments = starts.split(".")
+            node = self._root
+            for segment in segments[:-1]:
+                node = node.children.get(segment)
+                if node is None:
+                    return found
+            prefix = ".".join(segments[:-1])
+            partial = segments[-1]
+            # children that start with partial are together when sorted
+            names = node.segments
+            if names is None:
+                names = node.segments = sorted(node.children)
+            for i in xrange(bisect_left(names, partial), len(names)):
+                segment = names[i]
+                if not segment.startswith(partial):
+                    break
+                path = prefix + "." + segment if prefix else segment
+                for path, obj in self._walk(node.children[segment], path):
+                    if path.startswith(starts) and path.endswith(ends):
+                        found[path] = obj
+            return found
+        # look up the last segment
+        last = ends.rpartition(".")[2]
+        if "." in ends:
+            # last segment is complete
+            nodes = self._by_name.get(last, ())
+        else:
+            # segments that end with last are together when reversed
+            nodes = []
+            suffixes, reverse = self._suffixes, last[::-1]
+            for i in xrange(bisect_left(suffixes, reverse), len(suffixes)):
+                suffix = suffixes[i]
+                if not suffix.startswith(reverse):
+                    break
+                nodes.extend(self._by_name[suffix[::-1]])
+        for node in nodes:
+            if node.entity is None:
+                continue
+            obj = node.entity()
+            if obj is not None:
+                path = node.path()
+                if path.endswith(ends):
+                    found[path] = obj
+        return found
+
+
 class MetaSpace(ABCMeta):
     """
     Meta class for the Space which gives the "physics" behaviour of the Space
@@ -317,7 +637,9 @@ class MetaSpace(ABCMeta):
                 # after initialization
                 # move to parent first as it is likely there
                 # won't be name conflict as name is object's id
-                self._space_parent = parent
+                if parent is not None:
+                    # keep the parent given in the initialization
+                    self._space_parent = parent
                 if name is not None:
                     # change the name in in-place parent's children
                     # and in hierarchy
@@ -333,17 +655,32 @@ class Space(with_metaclass(MetaSpace, object)):
     """
     Anything that is created must have a name attribute and be in the Space
     """
-    _space_entities = WeakValueDictionary()
-    _space_collect_entities = True
+    __slots__ = ('_space_parent_', '_space_children_', '_space_name_handles',
+                 '_name', '__weakref__')
+    _space_entities = HierarchyTrie()
+    # force a garbage collection when a hierarchy is in conflict in case
+    # the object with that hierarchy is only kept by reference cycles
+    _space_collect_entities = False
+    _space_conflicts = 0  # hierarchies found in conflict
+    _space_collections = 0  # garbage collections forced by conflicts
 
     def __new__(cls, *args, **kwargs):
         self = super(Space, cls).__new__(cls)
         self._space_parent_ = None  # Space object can only have one parent
         self._space_entities[str(id(self))] = self
-        self._space_children = SpaceHandle(self, WeakRefDictionary())  # Space children
+        self._space_children_ = None  # Space children when there are
         self._space_name_handles = set()  # Space positions
         return self
 
+    @property
+    def _space_children(self):
+        # children are created when they are needed
+        children = self._space_children_
+        if children is None:
+            children = self._space_children_ = SpaceHandle(
+                self, WeakRefDictionary())
+        return children
+
     def _space_correct_hierarchy(self, old_hierarchy):
         """
         private function used to correct an old hierarchy of this
@@ -353,14 +690,48 @@ class Space(with_metaclass(MetaSpace, object)):
         """
         # register new hierarchy
         new_hierarchy = self._space_hierarchy()
-        # change old hierarchy
-        self._space_entities[new_hierarchy] = self._space_entities.pop(old_hierarchy)
-        # change children's old hierarchies
-        for i in self._space_children.values():
+        # change old hierarchy and all the hierarchies under it
+        # (it is registered again if the object was deleted from Space)
+        if not self._space_move_hierarchy(old_hierarchy, new_hierarchy, self):
+            self._space_correct_children(old_hierarchy, new_hierarchy)
+
+    def _space_correct_children(self, old_hierarchy, new_hierarchy):
+        """
+        move the hierarchies of the children of an object that is not
+        registered in the Space.
+
+        :param old_hierarchy: string of the previous hierarchy
+        :param new_hierarchy: string of the new hierarchy
+        """
+        children = self._space_children_
+        if children is None:
+            return
+        for i in children.values():
             i = i()
-            old = new_hierarchy + "." + i.name
-            new = old_hierarchy + "." + i.name
-            self._space_entities[old] = self._space_entities.pop(new)
+            old = old_hierarchy + "." + i.name
+            new = new_hierarchy + "." + i.name
+            if (not self._space_move_hierarchy(old, new, i) and
+                    i._space_parent_ is self):
+                i._space_correct_children(old, new)
+
+    def _space_move_hierarchy(self, old_hierarchy, new_hierarchy, obj):
+        """
+        move the hierarchy of an object and the hierarchies under it.
+        If the object is not registered in old_hierarchy (e.g. it was
+        deleted from Space) it is registered in new_hierarchy alone.
+
+        :param old_hierarchy: string of the previous hierarchy
+        :param new_hierarchy: string of the new hierarchy
+        :param obj: object registered in old_hierarchy
+        :return: True if obj was registered in old_hierarchy, False if
+            the hierarchies under it were not moved
+        """
+        entities = self._space_entities
+        if entities.get(old_hierarchy) is not obj:
+            entities.add(new_hierarchy, obj)
+            return False
+        entities.move(old_hierarchy, new_hierarchy)
+        return True
 
     @property
     def name(self):
@@ -446,13 +817,16 @@ class Space(with_metaclass(MetaSpace, object)):
         :return: True if hierarchy in space else False
         """
         # do not proceed if there is a conflict in hierarchy
+        # objects are unregistered when deleted or freed, so a hierarchy
+        # in self._space_entities belongs to an object that is alive
         if hierarchy in self._space_entities:
-            # ensure hierarchy is updated to use self._space_entities
+            Space._space_conflicts += 1
+            # unless it is only kept by reference cycles
             if self._space_collect_entities:
+                Space._space_collections += 1
                 self._space_collect()
-            # previous evaluation was lazy, this ones evaluates
-            # with updated self._space_entities
-            return hierarchy in self._space_entities
+                return hierarchy in self._space_entities
+            return True
         else:
             return False
         
@@ -512,8 +886,7 @@ class Space(with_metaclass(MetaSpace, object)):
             index = key.index("*")
             starts = key[:index]
             ends = key[index+1:]
-            return {i:j for i, j in self._space_entities.items()
-                    if i.startswith(starts) and i.endswith(ends)}
+            return self._space_entities.match(starts, ends)
         except ValueError:
             return self._space_entities[key]
 
@@ -604,30 +977,46 @@ class Space(with_metaclass(MetaSpace, object)):
 
         :param child: child Space object
         """
-        name = child.name
-        if name in self._space_children:
-            if self._space_children[name]() is not child:
-                raise KeyError("conflicting name '{}' in children of "
-                               "parent '{}'".format(child.name, self.name))
-            else:
+        self._space_add_children((child,))
+
+    def _space_add_children(self, children):
+        """
+        add many objects in the internal children at once. The weak
+        references of the new children are put directly in the children
+        instead of being copied by the WeakRefDictionary.
+
+        :param children: iterable of child Space objects
+        """
+        handle = self._space_children
+        refs = handle.handle  # WeakRefDictionary
+        if refs._pending_removals:
+            refs._commit_removals()
+        data = refs.data
+        for child in children:
+            name = child.name
+            struct = data.get(name)
+            if struct is not None and struct() is not None:
+                if struct() is not child:
+                    raise KeyError("conflicting name '{}' in children of "
+                                   "parent '{}'".format(name, self.name))
                 #print("Warning: {} already in {}".format(child, self))
-                struct = self._space_children[name]
                 struct._count += 1
-                return
-
-        child_ref = WeakWatcherWithData(child)
-        child_ref._count = 0
-        self._space_children[name] = child_ref
-        child._space_name_handles.add(self._space_children)
+                continue
+            child_ref = WeakWatcherWithData(child, refs._remove, name)
+            child_ref._count = 0
+            data[name] = child_ref
+            child._space_name_handles.add(handle)
 
-    def _space_remove_child(self, child):
+    def _space_remove_child(self, child, name=None):
         """
         remove an object in the internal children to disappear in the Space
         as inside this object.
 
         :param child: child Space object
+        :param name: name of child if it is already known
         """
-        name = child.name
+        if name is None:
+            name = child.name
         struct = self._space_children[name]
         struct._count -= 1
         if struct._count <= 0:
@@ -639,12 +1028,31 @@ class Space(with_metaclass(MetaSpace, object)):
         delete Space object to outer Space. That is from all Space
         objects like Groups, parents and containers.
         """
-        self._space_parent = None  # break any parent relationship
+        parent = self._space_parent_
         name = self.name
+        if parent is not None and not self._space_children_:
+            # there are no children to move to the outer Space, so
+            # the object is unregistered from its parent directly
+            hierarchy = parent._space_hierarchy(name)
+            parent._space_remove_child(self, name)
+            self._space_parent_ = None
+            self._space_entities.discard(hierarchy, self)
+            self._parent_changed_event(parent)
+            in_space = False
+        else:
+            self._space_parent = None  # break any parent relationship
+            in_space = True  # registered in the outer Space
         # delete object from all handles, that is the Space in general
         # self._space_name_handles will change size until it reaches 0
         for handle in list(self._space_name_handles):
-            handle.remove_name(name)
+            if handle.parent is None:
+                # the owner of the handle was freed
+                self._space_name_handles.discard(handle)
+            else:
+                handle.remove_name(name)
+        if in_space:
+            # unregister from the Space hierarchy
+            self._space_entities.discard(name, self)
 
     def _name_changed_event(self, old_name):
         """
@@ -685,30 +1093,234 @@ def deco_name(func, ismethod=True):
     return _func
 
 
+class _NameLink(object):
+    """
+    node of the linked list of OrderedNames
+    """
+    __slots__ = ('prev', 'next', 'key', 'value', '__weakref__')
+
+
+class _OrderedNamesKeys(KeysView):
+
+    def __reversed__(self):
+        return self._mapping._iter_links('key', True)
+
+
+class _OrderedNamesValues(ValuesView):
+
+    def __iter__(self):
+        return self._mapping._iter_links('value')
+
+    def __reversed__(self):
+        return self._mapping._iter_links('value', True)
+
+
+class _OrderedNamesItems(ItemsView):
+
+    def __iter__(self):
+        for link in self._mapping._iter_links():
+            yield (link.key, link.value)
+
+    def __reversed__(self):
+        for link in self._mapping._iter_links(reverse=True):
+            yield (link.key, link.value)
+
+
+class OrderedNames(MutableMapping):
+    """
+    Ordered dictionary of names that can rename a key in place.
+
+    The items are kept in a doubly linked list of nodes and each name
+    maps to its node, so that renaming only replaces the name of the
+    node instead of re-inserting all the items like OrderedDict needs
+    to keep the order. As in OrderedDict the links to the previous
+    nodes are weak so that the list is freed without the garbage
+    collector.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._hardroot = _NameLink()  # sentinel of the linked list
+        self._root = root = proxy(self._hardroot)
+        root.prev = root.next = root
+        self._map = {}  # name and its node
+        self.update(*args, **kwargs)
+
+    def __getitem__(self, key):
+        return self._map[key].value
+
+    def __setitem__(self, key, value):
+        link = self._map.get(key)
+        if link is None:
+            root = self._root
+            last = root.prev
+            self._map[key] = link = _NameLink()
+            link.prev, link.next, link.key = last, root, key
+            last.next = link
+            root.prev = proxy(link)
+        link.value = value
+
+    def __delitem__(self, key):
+        link = self._map.pop(key)
+        link_prev, link_next = link.prev, link.next
+        link_prev.next = link_next
+        link_next.prev = link_prev
+        # unlinked nodes keep their next link so that iterators that
+        # are on them can continue
+        link.prev = None
+
+    def __contains__(self, key):
+        return key in self._map
+
+    def __len__(self):
+        return len(self._map)
+
+    def _iter_links(self, attr=None, reverse=False):
+        # links can be deleted while they are iterated, unlinked ones
+        # have no prev link and are skipped
+        if reverse:
+            # previous links are weak so the links are taken first
+            for link in reversed(list(self._iter_links())):
+                if link.prev is not None:
+                    yield link if attr is None else getattr(link, attr)
+            return
+        root = self._root
+        link = root.next
+        while link is not root:
+            if link.prev is not None:
+                yield link if attr is None else getattr(link, attr)
+            link = link.next
+
+    def __iter__(self):
+        return self._iter_links('key')
+
+    def __reversed__(self):
+        return self._iter_links('key', True)
+
+    def keys(self):
+        return _OrderedNamesKeys(self)
+
+    def values(self):
+        return _OrderedNamesValues(self)
+
+    def items(self):
+        return _OrderedNamesItems(self)
+
+    def popitem(self, last=True):
+        """
+        remove and return the last (key, value) pair or the first if
+        last is False
+        """
+        if not self._map:
+            raise KeyError('dictionary is empty')
+        link = self._root.prev if last else self._root.next
+        key, value = link.key, link.value
+        del self[key]
+        return key, value
+
+    def clear(self):
+        for link in self._map.values():
+            link.prev = None  # unlinked
+        root = self._root
+        root.prev = root.next = root
+        self._map.clear()
+
+    def rename(self, old_name, new_name):
+        """
+        replace the name of an item keeping its position
+
+        :param old_name: current name of the item
+        :param new_name: name to give to the item
+        """
+        if new_name in self._map:
+            raise KeyError("name '{}' already exists".format(new_name))
+        link = self._map.pop(old_name)
+        link.key = new_name
+        self._map[new_name] = link
+
+    def reverse(self):
+        """
+        reverse the order of the items in place
+        """
+        root = self._root
+        last = root
+        # link the nodes from the last one keeping weak links to previous
+        links = list(self._iter_links())  # next links are not proxies
+        for link in reversed(links):
+            link.prev = last
+            last.next = link
+            last = proxy(link)
+        last.next = root
+        root.prev = last
+
+    def __eq__(self, other):
+        if isinstance(other, (OrderedNames, OrderedDict)):
+            return len(self) == len(other) and list(self.items()) == list(
+                other.items())
+        return dict(self.items()) == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def __reduce__(self):
+        # the linked list is recursive so it is pickled as a list
+        return self.__class__, (list(self.items()),)
+
+    def __repr__(self):
+        return '%s(%r)' % (self.__class__.__name__, list(self.items()))
+
+
 class GroupHandle(SpaceHandle):
 
-    def change_name(self, old_name, new_name, obj):
+    def __init__(self, parent, handle):
+        """
+        :param parent: Group
+        :param handle: names of the Group. They are looked up from the
+            Group so that the objects in them do not keep the names
+            alive when the Group is freed
+        """
+        self._parent = ref(parent)
 
-        dict_to_update = self.parent.names
-        if self.handle is dict_to_update and isinstance(dict_to_update, OrderedDict):
-            # ordered dict cannot be destroyed and must keep the same order
-            i = self.parent.index(old_name)
-            items = list(dict_to_update.items())
-            old_name_, val = items[i]
-            if old_name != old_name_ or obj is not val:
-                raise RuntimeError("Group change_name operation failed "
-                                   "because its index method is broken")
-            items[i] = (new_name, val)  # update new name
-            # because OrderedDict order cannot be altered
-            # then we need to clear it and re-insert the items
-            dict_to_update.clear()
-            dict_to_update.update(items)
-        else:
-            # assume it is a simple dict
-            self.handle[new_name] = self.handle.pop(old_name)
+    @property
+    def handle(self):
+        parent = self.parent
+        if parent is None:
+            return {}
+        return parent.names
+
+    def change_name(self, old_name, new_name, obj):
+        parent = self.parent
+        if parent is None:
+            return
+        # snapshots must not be taken while the names are changed
+        with parent._version_lock:
+            parent._snapshot = None
+            dict_to_update = parent.names
+            if isinstance(dict_to_update, OrderedNames):
+                # the position of the item is kept
+                dict_to_update.rename(old_name, new_name)
+            elif isinstance(dict_to_update, OrderedDict):
+                # ordered dict cannot be destroyed and must keep the same order
+                i = parent.index(old_name)
+                items = list(dict_to_update.items())
+                old_name_, val = items[i]
+                if old_name != old_name_ or obj is not val:
+                    raise RuntimeError("Group change_name operation failed "
+                                       "because its index method is broken")
+                items[i] = (new_name, val)  # update new name
+                # because OrderedDict order cannot be altered
+                # then we need to clear it and re-insert the items
+                dict_to_update.clear()
+                dict_to_update.update(items)
+            else:
+                # assume it is a simple dict
+                dict_to_update[new_name] = dict_to_update.pop(old_name)
 
     def remove_name(self, name):
-        self.parent.discard(name)
+        parent = self.parent
+        if parent is not None:
+            parent.discard(name)
 
 
 class Group(Space, MutableSet):
@@ -720,29 +1332,48 @@ class Group(Space, MutableSet):
 
     The Group can be seen as an Ordered set that can iterate them as list
     and retrieve objects by name or reference as in dictionaries.
+
+    While the Group is iterated the operations that change it are
+    deferred until the iteration ends. With snapshot=True the Group is
+    instead iterated over an immutable snapshot of its items, which is
+    shared by all the iterations until the Group changes, so that the
+    operations are applied right away even from other threads.
     """
     # https://stackoverflow.com/a/3387975/5288758
     # https://github.com/LuminosoInsight/ordered-set/blob/master/ordered_set.py
     # consider https://stackoverflow.com/a/11560258/5288758
 
-    def __init__(self, iterable=None, as_parent=False, as_contained=False):
+    # methods of the operations deferred in _pending_removals as
+    # (operation code, arguments)
+    _operations = ("_safe_discard", "_safe_add", "_safe_pop", "_safe_clear",
+                   "_safe_extend")
+
+    def __init__(self, iterable=None, as_parent=False, as_contained=False,
+                 snapshot=False):
         # A list of keys to be removed safely. This should be Thread safe!
         self._pending_removals = []
         self._iterating = set()
         self.lock_iteration = RLock()
 
+        # copy-on-write iteration
+        self.snapshot_iteration = snapshot
+        self._snapshot = None  # tuple of items until the Group changes
+        self._version_lock = RLock()  # to change or take a snapshot
+
         def _remove(wr, selfref=ref(self)):
             self = selfref()
             if self is not None:
-                if self._iterating:
-                    self._pending_removals.append(wr.key)
-                else:
-                    del self[wr.key]
+                self.discard(wr.key)
         self._remove = _remove  # callback to give to ref objects
 
+        # positional index of names, built when needed and
+        # invalidated when the order of names changes
+        self._positions = None  # list of items
+        self._indexes = None  # item and its position
+
         # dictionary-like object to allocate names
         if not hasattr(self, "names"):
-            self.names = OrderedDict()
+            self.names = OrderedNames()
         # wrap names to a handle registered to this Group
         self._group_handle = self._create_group_handle(self.names)
 
@@ -771,10 +1402,7 @@ class Group(Space, MutableSet):
             self = selfref()
             key = keyref()
             if self is not None and key is not None:
-                if self._iterating:
-                    self._pending_removals.append(key)
-                else:
-                    del self[key]
+                self.discard(key)
         s = "remove " + str(key)
         remove.__name__ = s
         remove.__doc__ = s
@@ -782,22 +1410,65 @@ class Group(Space, MutableSet):
 
     def _commit_removals(self):
         """
-        remove pending removals when it is safe
+        apply pending operations when it is safe, in the order they
+        were requested
         """
-        l = self._pending_removals
         # We shouldn't encounter any KeyError, because this method should
         # always be called *before* mutating the dict.
-        while l:
-            op, val = l.pop()
-            if op:
-                val()  # execute operation
-            else:
-                # discard key
-                self._safe_discard(val)
+        while self._pending_removals:
+            pending, self._pending_removals = self._pending_removals, []
+            for op, args in pending:
+                getattr(self, self._operations[op])(*args)
+
+    def _apply(self, op, *args):
+        """
+        apply an operation or defer it while the Group is iterated
+
+        :param op: index of the operation in _operations
+        :param args: arguments of the operation
+        :return: returned value of the operation or None if deferred
+        """
+        if self.snapshot_iteration:
+            # iterations use their own snapshot
+            with self._version_lock:
+                return getattr(self, self._operations[op])(*args)
+        if self._iterating:
+            self._pending_removals.append((op, args))
+        else:
+            return getattr(self, self._operations[op])(*args)
+
+    def snapshot(self):
+        """
+        get the items of the Group in a tuple that is reused until the
+        Group changes
+
+        :return: tuple of items
+        """
+        snapshot = self._snapshot
+        if snapshot is None:
+            with self._version_lock:
+                snapshot = self._snapshot = tuple(self._safe_iter())
+        return snapshot
 
     def __len__(self):
         return len(self.names)
 
+    def _positional(self):
+        """
+        get the list of items, rebuilding the positional index if it
+        was invalidated since it was last used
+        """
+        positions = self._positions
+        if positions is None:
+            # items are indexed by id because Groups cannot be hashed
+            positions = list(self.names.values())
+            self._indexes = {id(key): i for i, key in enumerate(positions)}
+            self._positions = positions
+        return positions
+
+    def _invalidate_positions(self):
+        self._positions = self._indexes = self._snapshot = None
+
     def _getitem_name(self, name):
         """
         this is used instead of self.names[key]
@@ -827,7 +1498,7 @@ class Group(Space, MutableSet):
             # if asked for a slice of the data
             # it is not returned in the same class as they are registered
             # in the space populating it
-            return list(self.names.values())[index]
+            return self._positional()[index]
         elif hasattr(index, '__iter__'):
             # if asked for a list of the elements
             return [self[i] for i in index]
@@ -901,6 +1572,12 @@ class Group(Space, MutableSet):
         else:
             self.names[key.name] = key
             key._space_name_handles.add(self._group_handle)
+            self._snapshot = None
+            positions = self._positions
+            if positions is not None:
+                # appending keeps the positional index
+                self._indexes[id(key)] = len(positions)
+                positions.append(key)
         return key
 
     def add(self, key):
@@ -909,10 +1586,9 @@ class Group(Space, MutableSet):
 
         If `key` is already in the Group, does not adds and returns the key
         """
-        if self._iterating:
-            self._pending_removals.append((1, lambda: self._safe_add(key)))
-        else:
-            return self._safe_add(key)
+        if self._iterating or self.snapshot_iteration:
+            return self._apply(1, key)
+        return self._safe_add(key)
 
     append = add
 
@@ -931,6 +1607,81 @@ class Group(Space, MutableSet):
         #                     'got %s' % type(sequence))
         return returned
 
+    def _safe_extend(self, sequence, as_parent=False, as_contained=False):
+        """
+        implementation of extend_bulk method to be run safely
+        """
+        names = self.names
+        new = OrderedDict()  # name and item not in the Group
+        for key in sequence:
+            if not isinstance(key, Space):
+                raise TypeError("object must be from Space not '{}'".format(key))
+            name = key.name
+            other = names.get(name)
+            if other is None:
+                other = new.setdefault(name, key)
+            if other is not key:
+                raise ValueError("name conflict. there is already an object "
+                                 "with name '{}' in this Group".format(name))
+        if as_parent or as_contained:
+            # the items must not fail when they become children
+            children = self._space_children_
+            for key in sequence:
+                if as_parent and (key is self or
+                                  key._space_parent_in_parents(self)):
+                    raise ValueError("circular reference in parents")
+                if children is None:
+                    continue
+                child = children.handle.get(key.name)
+                if child is not None and child() is not key:
+                    raise KeyError("conflicting name '{}' in children of "
+                                   "parent '{}'".format(key.name, self.name))
+        # all items are valid, now they can be added
+        if as_parent:
+            for key in sequence:
+                key._space_parent = self
+        if as_contained:
+            self._space_add_children(sequence)
+        handle = self._group_handle
+        for key in new.values():
+            key._space_name_handles.add(handle)
+        self._extend_new(new)
+        return len(new)
+
+    def _extend_new(self, new):
+        """
+        insert items validated by _safe_extend
+
+        :param new: OrderedDict of names and items not in the Group
+        """
+        self.names.update(new)
+        self._snapshot = None
+        positions = self._positions
+        if positions is not None:
+            # appending keeps the positional index
+            indexes = self._indexes
+            for i, key in enumerate(new.values(), len(positions)):
+                indexes[id(key)] = i
+            positions.extend(new.values())
+
+    def extend_bulk(self, sequence, as_parent=False, as_contained=False):
+        """
+        Add all the items of a sequence to the Group in one pass.
+
+        Unlike update, all the items are validated before any of them is
+        added, so that if there is a name conflict or an object that is
+        not from Space the Group is not changed.
+
+        :param sequence: iterable of Space objects
+        :param as_parent: True to assign this Group as parent of the items
+        :param as_contained: True to assign this Group as container of
+            the items
+        :return: number of items that were not in the Group. If the Group
+            is being iterated the items are added later and None is
+            returned
+        """
+        return self._apply(4, list(sequence), as_parent, as_contained)
+
     def index(self, key):
         """
         Get the index of a given entry, raising an IndexError if it's not
@@ -946,14 +1697,10 @@ class Group(Space, MutableSet):
             raise IndexError("{} not in {}".format(key, self))
         elif isinstance(key, basestring):
             # is name
-            for i, j in enumerate(self.names.keys()):
-                if j == key:
-                    return i
-        else:
-            # is agent
-            for i, j in enumerate(self.names.values()):
-                if j is key:
-                    return i
+            key = self.names[key]
+        # is agent
+        self._positional()
+        return self._indexes[id(key)]
 
     def _safe_pop(self):
         """
@@ -964,6 +1711,11 @@ class Group(Space, MutableSet):
 
         key, value = self.names.popitem()
         value._space_name_handles.remove(self._group_handle)
+        self._snapshot = None
+        if self._positions is not None:
+            # popping the last keeps the positional index
+            self._positions.pop()
+            del self._indexes[id(value)]
         return value
 
     def pop(self):
@@ -972,10 +1724,7 @@ class Group(Space, MutableSet):
 
         Raises KeyError if the Group is empty.
         """
-        if self._iterating:
-            self._pending_removals.append((1, self._safe_pop))
-        else:
-            return self._safe_pop()
+        return self._apply(2)
 
     def _safe_discard(self, key):
         """
@@ -989,6 +1738,7 @@ class Group(Space, MutableSet):
         except KeyError:
             return
         value._space_name_handles.remove(self._group_handle)
+        self._invalidate_positions()
         return value  # sets return None but this can return value
 
     def discard(self, value):
@@ -998,10 +1748,9 @@ class Group(Space, MutableSet):
         The MutableSet mixin uses this to implement the .remove() method, which
         *does* raise an error when asked to remove a non-existent item.
         """
-        if self._iterating:
-            self._pending_removals.append((0, value))
-        else:
-            return self._safe_discard(value)
+        if self._iterating or self.snapshot_iteration:
+            return self._apply(0, value)
+        return self._safe_discard(value)
 
     def _safe_clear(self):
         """
@@ -1010,15 +1759,13 @@ class Group(Space, MutableSet):
         for i in self.names.values():
             i._space_name_handles.remove(self._group_handle)
         self.names.clear()
+        self._invalidate_positions()
 
     def clear(self):
         """
         Remove all items from this Group.
         """
-        if self._iterating:
-            self._pending_removals.append((1, self._safe_clear))
-        else:
-            return self._safe_clear()
+        return self._apply(3)
 
     def clear_in_space(self):
         """
@@ -1034,6 +1781,9 @@ class Group(Space, MutableSet):
         return self.names.values()
 
     def __iter__(self):
+        if self.snapshot_iteration:
+            return iter(self.snapshot())
+
         def safe_iter(self):
             res = None
             try:
@@ -1047,9 +1797,9 @@ class Group(Space, MutableSet):
         return iter(safe_iter(self))
 
     def reverse(self):
-        items = list(reversed(self.names.items()))
-        self.names.clear()
-        self.names.update(items)
+        with self._version_lock:
+            self.names.reverse()
+            self._invalidate_positions()
 
     def __reversed__(self):
         return reversed(self.names.values())
@@ -1086,6 +1836,16 @@ class Group(Space, MutableSet):
         self.lock_iteration.release()
     
 
+class _Removed(object):
+    """tombstone of the items removed from a CompleteGroup"""
+    __slots__ = ()
+
+    def __repr__(self):
+        return "<removed>"
+
+_removed = _Removed()
+
+
 class CompleteGroup(Group):
     """
     Class to create Groups with faster facilities for indexing
@@ -1093,15 +1853,109 @@ class CompleteGroup(Group):
     slower times when adding Space objects and an slight increase of memory
     usage. The difference with a pure Group is negligible when managing small
     amounts of data. Use this class when the focus is manipulating indexes and
-    comparing data withing or among Groups. For intensive adding and removal
-    of objects use a pure Group.
+    comparing data withing or among Groups.
+
+    Removed items leave a tombstone in their place so that removing is
+    O(log n) instead of re-indexing all the items after them. While there
+    are tombstones, indexes are found in O(log n) with a Fenwick tree and
+    the tombstones are compacted once they are more than the items.
+    If the order of the items is not needed use ordered=False to move the
+    last item to the place of the removed one in O(1) instead.
     """
 
-    def __init__(self, iterable=None, as_parent=False, as_contained=False):
-        self.items = []  # keep items
-        self.map = {}  # keep item and indexes
+    def __init__(self, iterable=None, as_parent=False, as_contained=False,
+                 ordered=True, snapshot=False):
+        self.items = []  # keep items and tombstones
+        self.map = {}  # keep item and position in items
         self.names = dict()  # keep index names and items
-        super(CompleteGroup, self).__init__(iterable, as_parent, as_contained)
+        self.ordered = ordered
+        self._dead = 0  # number of tombstones
+        self._tree = None  # Fenwick tree of items that are not tombstones
+        super(CompleteGroup, self).__init__(iterable, as_parent, as_contained,
+                                            snapshot)
+
+    def _build_tree(self):
+        """
+        build the Fenwick tree over the items which are not tombstones
+        """
+        tree = [0] * (len(self.items) + 1)
+        for i, item in enumerate(self.items, 1):
+            if item is not _removed:
+                tree[i] += 1
+            parent = i + (i & -i)
+            if parent < len(tree):
+                tree[parent] += tree[i]
+        self._tree = tree
+
+    def _tree_append(self):
+        """
+        register in the Fenwick tree the item appended to items
+        """
+        tree = self._tree
+        i = len(tree)
+        value = 1
+        j = i - 1
+        while j > i - (i & -i):
+            value += tree[j]
+            j -= j & -j
+        tree.append(value)
+
+    def _tree_add(self, position, value):
+        tree = self._tree
+        i = position + 1
+        while i < len(tree):
+            tree[i] += value
+            i += i & -i
+
+    def _rank(self, position):
+        """
+        index of the item at a position in items
+        """
+        if not self._dead:
+            return position
+        tree = self._tree
+        rank = 0
+        i = position
+        while i > 0:
+            rank += tree[i]
+            i -= i & -i
+        return rank
+
+    def _position(self, index):
+        """
+        position in items of the item at an index
+        """
+        n = len(self.map)
+        if index < 0:
+            index += n
+        if not 0 <= index < n:
+            raise IndexError("Group index out of range")
+        if not self._dead:
+            return index
+        tree = self._tree
+        position = 0
+        step = 1
+        while step * 2 < len(tree):
+            step *= 2
+        # descend the tree to the position of the (index+1)-th item
+        remaining = index + 1
+        while step:
+            i = position + step
+            if i < len(tree) and tree[i] < remaining:
+                position = i
+                remaining -= tree[i]
+            step //= 2
+        return position
+
+    def _compact(self):
+        """
+        remove the tombstones from items
+        """
+        if self._dead:
+            self.items = [i for i in self.items if i is not _removed]
+            self.map = {key: i for i, key in enumerate(self.items)}
+            self._dead = 0
+            self._tree = None
 
     def __getitem__(self, index):
         """
@@ -1118,10 +1972,13 @@ class CompleteGroup(Group):
         if isinstance(index, basestring):
             # if looking by name
             return self._getitem_name(index)
-        elif hasattr(index, '__index__') or isinstance(index, slice):
+        elif hasattr(index, '__index__'):
+            return self.items[self._position(index.__index__())]
+        elif isinstance(index, slice):
             # if asked for a slice of the data
             # it is not returned in the same class as they are registered
             # in the space populating it
+            self._compact()
             return self.items[index]
         elif hasattr(index, '__iter__'):
             # if asked for a list of the elements
@@ -1149,7 +2006,7 @@ class CompleteGroup(Group):
             return [self.index(subkey) for subkey in key]
         # key can be anything supported by group
         try:
-            return self.map[self[key]]
+            return self._rank(self.map[self[key]])
         except KeyError:
             raise IndexError("{} not in {}".format(key, self))
 
@@ -1168,20 +2025,45 @@ class CompleteGroup(Group):
             key._space_name_handles.add(self._group_handle)
             self.map[key] = len(self.items)
             self.items.append(key)
-        return self.map[key]
+            self._snapshot = None
+            if self._dead:
+                self._tree_append()
+        return self._rank(self.map[key])
+
+    def _extend_new(self, new):
+        self.names.update(new)
+        items = self.items
+        self.map.update(zip(new.values(), xrange(len(items),
+                                                 len(items) + len(new))))
+        items.extend(new.values())
+        self._snapshot = None
+        if self._dead:
+            for _ in xrange(len(new)):
+                self._tree_append()
 
     def _safe_pop(self):
         """
         implementation of pop method to be run safely
         """
-        if not self.items:
+        if not self.map:
             raise KeyError('Group is empty')
 
-        elem = self.items[-1]
-        del self.items[-1]
+        items = self.items
+        while items[-1] is _removed:
+            # tombstones at the end are not needed
+            del items[-1]
+            del self._tree[-1]
+            self._dead -= 1
+        elem = items[-1]
+        del items[-1]
+        if self._dead:
+            del self._tree[-1]
+        else:
+            self._tree = None
         del self.map[elem]
         del self.names[elem.name]
         elem._space_name_handles.remove(self._group_handle)
+        self._snapshot = None
         return elem
 
     def _safe_discard(self, key):
@@ -1194,18 +2076,36 @@ class CompleteGroup(Group):
             except KeyError:
                 return  # not deleted
 
+        if not self.ordered:
+            self._compact()
         try:
-            i = self.map[key]
+            i = self.map.pop(key)
         except KeyError:
             return  # not deleted
 
-        del self.items[i]
-        del self.map[key]
         del self.names[key.name]
         key._space_name_handles.remove(self._group_handle)
-        for k, v in self.map.items():
-            if v >= i:
-                self.map[k] = v - 1
+        self._snapshot = None
+        items = self.items
+        if i == len(items) - 1:
+            # last item does not leave a tombstone
+            del items[-1]
+            if self._dead:
+                del self._tree[-1]
+        elif not self.ordered:
+            # move the last item to the free place
+            last = items.pop()
+            items[i] = last
+            self.map[last] = i
+        else:
+            items[i] = _removed
+            if not self._dead:
+                self._build_tree()
+            else:
+                self._tree_add(i, -1)
+            self._dead += 1
+            if self._dead > len(self.map):
+                self._compact()
         return key  # sets return None but this can return value
 
     def _safe_clear(self):
@@ -1213,29 +2113,40 @@ class CompleteGroup(Group):
         implementation of clear method to be run safely
         """
         names = self._group_handle
-        for i in self.items:
+        for i in self.map:
             i._space_name_handles.remove(names)
-        self.items.clear()
+        del self.items[:]
         names.clear()
         self.map.clear()
+        self._dead = 0
+        self._tree = None
+        self._snapshot = None
 
     def _safe_iter(self):
         """
         implementation of __iter__ method to be run safely
         """
+        if self._dead:
+            return (i for i in self.items if i is not _removed)
         return self.items
 
     def reverse(self):
-        self.items.reverse()
-        # remap indexes
-        for i, key in enumerate(self.items):
-            self.map[key] = i
+        with self._version_lock:
+            self._compact()
+            self.items.reverse()
+            # remap indexes
+            for i, key in enumerate(self.items):
+                self.map[key] = i
+            self._snapshot = None
 
     def __reversed__(self):
+        self._compact()
         return reversed(self.items)
 
     def __eq__(self, other):
         if isinstance(other, self.__class__):
+            self._compact()
+            other._compact()
             return len(self) == len(other) and self.items == other.items
         try:
             other_as_set = set(other)
@@ -1253,6 +2164,9 @@ class Agent(Space):
     can be observable and have positions in the Space. From here
     anything is derived and populated in the world.
     """
+    __slots__ = ('_to_compute', 'active', 'visible', 'drawing', 'cnt',
+                 'rotated_box')
+
     def __init__(self):
         self._to_compute = True
         self.active = True
@@ -1360,6 +2274,91 @@ class Agent(Space):
         return Agent.get_cnt_from_rotated_box(
             Agent.get_rotated_box_from_bounding_box(bounding_box), _type)
 
+    @staticmethod
+    def get_bounding_boxes_from_rotated_boxes(rotated_boxes):
+        """
+        vectorized get_bounding_box_from_rotated_box
+
+        :param rotated_boxes: array of N rotated boxes with format
+            (cx, cy, sz_x, sz_y, angle)
+        :return: array of N bounding boxes with format (x, y, sz_x, sz_y)
+        """
+        rotated_boxes = np.asarray(rotated_boxes, np.float64).reshape(-1, 5)
+        bounding_boxes = rotated_boxes[:, :4].copy()
+        bounding_boxes[:, :2] -= rotated_boxes[:, 2:4] / 2.
+        return bounding_boxes
+
+    @staticmethod
+    def get_rotated_boxes_from_bounding_boxes(bounding_boxes):
+        """
+        vectorized get_rotated_box_from_bounding_box
+
+        :param bounding_boxes: array of N bounding boxes with format
+            (x, y, sz_x, sz_y)
+        :return: array of N rotated boxes with format
+            (cx, cy, sz_x, sz_y, angle)
+        """
+        bounding_boxes = np.asarray(bounding_boxes, np.float64).reshape(-1, 4)
+        rotated_boxes = np.zeros((len(bounding_boxes), 5), np.float64)
+        rotated_boxes[:, :4] = bounding_boxes
+        rotated_boxes[:, :2] += bounding_boxes[:, 2:4] / 2.
+        return rotated_boxes
+
+    @staticmethod
+    def get_cnts_from_rotated_boxes(rotated_boxes, _type=np.int32):
+        """
+        vectorized get_cnt_from_rotated_box
+
+        :param rotated_boxes: array of N rotated boxes with format
+            (cx, cy, sz_x, sz_y, angle)
+        :param _type: type of the contours. None to keep them as floats
+        :return: array of N contours of shape (N, 4, 1, 2) with format
+            [left-top, right-top, right-bottom, left-bottom]
+        """
+        rotated_boxes = np.asarray(rotated_boxes, np.float64).reshape(-1, 5)
+        tx, ty, sz_x, sz_y, angle = rotated_boxes.T
+        # construct contours in origin
+        x, y = sz_x / 2., sz_y / 2.
+        px = np.stack((-x, x, x, -x), 1)
+        py = np.stack((-y, -y, y, y), 1)
+        # rotate and translate
+        a = np.deg2rad(angle)[:, None]
+        c, s = np.cos(a), np.sin(a)
+        cnts = np.stack((c * px - s * py + tx[:, None],
+                         s * px + c * py + ty[:, None]), 2)[:, :, None, :]
+        if _type is None:
+            return cnts
+        return cnts.astype(_type)
+
+    @staticmethod
+    def get_centroids_from_cnts(cnts):
+        """
+        vectorized centroids of N contours with the same number of points
+        as given by cv2.moments.
+
+        :param cnts: array of N integer contours of shape (N, K, 1, 2)
+        :return: array of centroids of shape (N, 3) with format (x, y, area)
+            and the mask of contours with area greater than zero.
+        """
+        cnts = np.asarray(cnts)
+        pts = cnts.reshape(len(cnts), cnts[0].size // 2 if len(cnts) else 0,
+                           2).astype(np.int64)
+        x, y = pts[:, :, 0], pts[:, :, 1]
+        xn, yn = np.roll(x, -1, 1), np.roll(y, -1, 1)
+        # shoelace formula with exact integers
+        cross = x * yn - xn * y
+        area2 = cross.sum(1)
+        mx = ((x + xn) * cross).sum(1)
+        my = ((y + yn) * cross).sum(1)
+        valid = area2 != 0
+        den = 3 * np.where(valid, area2, 1)
+        centroids = np.zeros((len(pts), 3), np.float64)
+        # truncate towards zero like int(m10/m00)
+        centroids[:, 0] = np.sign(mx * den) * (np.abs(mx) // np.abs(den))
+        centroids[:, 1] = np.sign(my * den) * (np.abs(my) // np.abs(den))
+        centroids[:, 2] = np.abs(area2) / 2.
+        return centroids, valid
+
     def __json_enco__(self):
         pass
 
@@ -1373,11 +2372,14 @@ class TailItem(object):
     #   https://stackoverflow.com/a/1816648/5288758
 
     _fields = ('cnt', 'rbox', 'bbox', 'pt')
-    __slots__ = ["_"+i for i in _fields]
+    # memoized geometry of cnt
+    _cached = ('circle', 'moments', 'hull')
+    __slots__ = ["_"+i for i in _fields + _cached]
 
     def __init__(self, cnt=None, rbox=None, bbox=None, pt=None):
         if cnt is None and rbox is None and bbox is None:
             raise Exception("must provide at least cnt, rbox or bbox")
+        self._circle = self._moments = self._hull = None
         self._cnt = cnt
         self._rbox = rbox
         if bbox is not None:
@@ -1412,46 +2414,129 @@ class TailItem(object):
             return cnt_check_intersection(self.cnt, cnt)
 
     def cnt_near(self, cnt, min_dist=None):
-        try:
-            (x2, y2), r2 = cnt.enclosing_circle()  # TailItem object
-        except AttributeError:
-            (x2, y2), r2 = cv2.minEnclosingCircle(cnt)
+        """
+        test whether internal cnt is near an external cnt
+
+        :param cnt: external contour or TailItem
+        :param min_dist: distance to be near. If None it is the mean of
+            the radii of the enclosing circles
+        :return: near, distance between the nearest extremes of the
+            enclosing circles
+        """
+        if not isinstance(cnt, TailItem):
+            cnt = TailItem(cnt=cnt)
+        near, distances = self.cnt_near_many([cnt], min_dist)
+        return bool(near[0]), distances[0]
+
+    def cnt_near_many(self, tail_items, min_dist=None):
+        """
+        test whether internal cnt is near the cnt of many tail items
+
+        The extremes (left, bottom, right and top) of the enclosing
+        circles of the items are compared at once.
+
+        :param tail_items: TailItem objects
+        :param min_dist: distance to be near. If None it is the mean of
+            the radii of the enclosing circles of each pair
+        :return: boolean array, array of distances between the nearest
+            extremes of the enclosing circles
+        """
+        centers, radii = enclosing_circles(tail_items)
         (x1, y1), r1 = self.enclosing_circle()
+        row1 = circle_extremes(np.array([[x1, y1]]), np.array([r1]))[0]
+        row2 = circle_extremes(centers, radii)
+        # distances between the 4 extremes of self and each item
+        distances = np.sqrt(np.sum((row1[None, :, None] -
+                                    row2[:, None, :]) ** 2, -1))
+        distances = distances.reshape(len(radii), 16).min(1) if len(radii) \
+            else np.zeros(0)
         if min_dist is None:
-            min_dist = (r1+r2)/2.
-        row1 = ((x1-r1, y1), (x1, y1+r1), (x1+r1, y1), (x1, y1-r1))
-        row2 = ((x2-r2, y2), (x2, y2+r2), (x2+r2, y2), (x2, y2-r2))
-        min_dt = np.inf
-        for i in row1:
-            for j in row2:
-                dt = euclidean(i, j)
-                if dt < min_dt:
-                    min_dt = dt
-                if dt < min_dist:
-                    return True, min_dt
-        return False, min_dt
+            min_dist = (r1 + radii) / 2.
+        return distances < min_dist, distances
 
     def point_near(self, point, min_dist=50):
-        try:
-            pt = point.pt[:2]  # TailItem object
-        except AttributeError:
-            pt = point[:2]
+        """
+        test whether a point is near internal cnt
+
+        :param point: point or TailItem
+        :param min_dist: distance to be near. If None it is the radius of
+            the enclosing circle
+        :return: near, distance to the nearest extreme of the enclosing
+            circle
+        """
+        near, distances = self.point_near_many([point], min_dist)
+        return bool(near[0]), distances[0]
+
+    def point_near_many(self, points, min_dist=50):
+        """
+        test whether many points are near internal cnt
+
+        :param points: points or TailItems
+        :param min_dist: distance to be near. If None it is the radius of
+            the enclosing circle
+        :return: boolean array, array of distances to the nearest extreme
+            of the enclosing circle
+        """
+        pts = np.array([getattr(p, "pt", p)[:2] for p in points],
+                       np.float64).reshape(-1, 2)
         (x1, y1), r1 = self.enclosing_circle()
+        row1 = circle_extremes(np.array([[x1, y1]]), np.array([r1]))[0]
+        distances = np.sqrt(np.sum((row1[None] - pts[:, None]) ** 2, -1))
+        distances = distances.min(1) if len(pts) else np.zeros(0)
         if min_dist is None:
             min_dist = r1
-        row1 = ((x1-r1, y1), (x1, y1+r1), (x1+r1, y1), (x1, y1-r1))
-        min_dt = np.inf
-        for i in row1:
-            dt = euclidean(i, pt)
-            if dt < min_dt:
-                min_dt = dt
-            if dt < min_dist:
-                return True, min_dt
-        return False, min_dt
+        return distances < min_dist, distances
 
     def enclosing_circle(self):
         # ((x, y), radius)
-        return cv2.minEnclosingCircle(self.cnt)
+        if self._circle is None:
+            self._circle = cv2.minEnclosingCircle(self.cnt)
+        return self._circle
+
+    @property
+    def moments(self):
+        """moments of cnt"""
+        if self._moments is None:
+            self._moments = cv2.moments(self.cnt)
+        return self._moments
+
+    @property
+    def area(self):
+        """area of cnt"""
+        return self.moments["m00"]
+
+    @property
+    def hull(self):
+        """convex hull of cnt"""
+        if self._hull is None:
+            self._hull = cv2.convexHull(self.cnt)
+        return self._hull
+
+    def shifted(self, x, y):
+        """
+        get a copy of this tail item moved by an offset
+
+        :param x: offset in x-coordinate
+        :param y: offset in y-coordinate
+        :return: new TailItem
+        """
+        cnt, rbox, bbox, pt = self._cnt, self._rbox, self._bbox, self._pt
+        if cnt is not None:
+            cnt = cnt + np.array((x, y), cnt.dtype)
+        if rbox is not None:
+            (cx, cy), size, angle = rbox
+            rbox = (cx + x, cy + y), size, angle
+        if bbox is not None:
+            bbox = (bbox[0] + x, bbox[1] + y) + tuple(bbox[2:])
+        if pt is not None:
+            pt = Point(pt.x + x, pt.y + y, pt.z)
+        item = self.__class__(cnt, rbox, bbox, pt)
+        if self._circle is not None:
+            (cx, cy), r = self._circle
+            item._circle = (cx + x, cy + y), r
+        if self._hull is not None:
+            item._hull = self._hull + np.array((x, y), self._hull.dtype)
+        return item
 
     @property
     def cnt(self):
@@ -1488,18 +2573,37 @@ class TailItem(object):
 
     @property
     def pt(self):
-        if self._pt is None:
+        if self._pt is None and self._centroid() is None:
+            # FIXME zerodivision
+            print("ZeroDivisionError with cnt", self.cnt)
+            #x, y = self.cnt[0][0]
+            raise ZeroDivisionError("cnt has no area")
+        return self._pt
+
+    def _centroid(self):
+        """
+        compute pt from the moments of cnt
+
+        :return: pt or None if cnt has no area
+        """
+        M = self._moments
+        if M is None:
+            # the moments are only kept if they are asked, they take
+            # more memory than the rest of the item
             M = cv2.moments(self.cnt)
-            z = M["m00"]
-            try:
-                x, y = (int(old_div(M["m10"], M["m00"])),
-                        int(old_div(M["m01"], M["m00"])))
-            except ZeroDivisionError:
-                # FIXME zerodivision
-                print("ZeroDivisionError with cnt", self.cnt)
-                #x, y = self.cnt[0][0]
-                raise
-            self._pt = Point(x, y, z)
+        z = M["m00"]
+        if not z:
+            return None
+        self._pt = Point(int(old_div(M["m10"], z)), int(old_div(M["m01"], z)),
+                         z)
+        return self._pt
+
+    def pt_or_nan(self):
+        """
+        :return: pt or (nan, nan, nan) if cnt has no area
+        """
+        if self._pt is None and self._centroid() is None:
+            return (np.nan,) * 3
         return self._pt
 
     # cnt behaviour
@@ -1539,4 +2643,276 @@ class TailItem(object):
         return (self._cnt, self._rbox, self._bbox, self._pt)
 
     def __setstate__(self, state):
-        (self._cnt, self._rbox, self._bbox, self._pt) = state
\ No newline at end of file
+        (self._cnt, self._rbox, self._bbox, self._pt) = state
+        self._circle = self._moments = self._hull = None
+
+
+def precompute(tail_items, fields=("pt", "circle")):
+    """
+    fill the lazy fields of many tail items at once so that detectors
+    compute the geometry of a whole frame in one pass
+
+    :param tail_items: TailItem objects
+    :param fields: names of the fields to compute from 'cnt', 'rbox',
+        'bbox', 'pt', 'moments', 'area', 'circle' and 'hull'
+    :return: tail_items
+    """
+    fields = set(fields)
+    if "pt" in fields:
+        # centroids of the contours of 4 points (from boxes) in batch
+        pending = [i for i in tail_items if i._pt is None and
+                   i._moments is None and i.cnt.shape == (4, 1, 2) and
+                   i.cnt.dtype.kind == "i"]
+        if pending:
+            pts, valid = Agent.get_centroids_from_cnts(
+                np.array([i.cnt for i in pending]))
+            for i, (x, y, z), ok in zip(pending, pts.tolist(), valid):
+                if ok:
+                    i._pt = Point(int(x), int(y), z)
+    for name in fields:
+        if name == "circle":
+            for i in tail_items:
+                i.enclosing_circle()
+        else:
+            for i in tail_items:
+                getattr(i, name)
+    return tail_items
+
+
+def enclosing_circles(tail_items):
+    """
+    get the enclosing circles of many tail items
+
+    :param tail_items: TailItem objects
+    :return: array of N centers, array of N radii
+    """
+    circles = [i.enclosing_circle() for i in tail_items]
+    centers = np.array([c for c, _ in circles], np.float64).reshape(-1, 2)
+    radii = np.array([r for _, r in circles], np.float64)
+    return centers, radii
+
+
+def circle_extremes(centers, radii):
+    """
+    get the left, bottom, right and top points of circles
+
+    :param centers: array of N centers
+    :param radii: array of N radii
+    :return: array of shape (N, 4, 2)
+    """
+    offsets = np.array([(-1, 0), (0, 1), (1, 0), (0, -1)], np.float64)
+    return centers[:, None] + radii[:, None, None] * offsets
+
+
+class TailItemBatch(object):
+    """
+    TailItemBatch(rboxes=None, bboxes=None) computes the geometry of N
+    tail items at once from rotated boxes or bounding boxes and gives
+    TailItems that are views into its arrays.
+    """
+
+    def __init__(self, rboxes=None, bboxes=None):
+        if rboxes is not None:
+            self.rboxes = np.asarray(rboxes, np.float64).reshape(-1, 5)
+            self.bboxes = Agent.get_bounding_boxes_from_rotated_boxes(self.rboxes)
+        elif bboxes is not None:
+            self.bboxes = np.asarray(bboxes).reshape(-1, 4)
+            self.rboxes = Agent.get_rotated_boxes_from_bounding_boxes(self.bboxes)
+        else:
+            raise Exception("must provide rboxes or bboxes")
+        self.cnts = Agent.get_cnts_from_rotated_boxes(self.rboxes)
+        self.pts, self._valid = Agent.get_centroids_from_cnts(self.cnts)
+        self._items = None
+
+    def __len__(self):
+        return len(self.rboxes)
+
+    def items(self):
+        """
+        :return: list of TailItems sharing the contours of the batch
+        """
+        if self._items is None:
+            cnts, valid = self.cnts, self._valid
+            self._items = [
+                TailItem(cnt=cnts[i], rbox=((cx, cy), (sz_x, sz_y), a),
+                         bbox=bbox, pt=(int(x), int(y), z) if valid[i] else None)
+                for i, ((cx, cy, sz_x, sz_y, a), bbox, (x, y, z)) in enumerate(
+                    zip(self.rboxes.tolist(), self.bboxes.tolist(),
+                        self.pts.tolist()))]
+        return self._items
+
+    def __getitem__(self, index):
+        return self.items()[index]
+
+    def __iter__(self):
+        return iter(self.items())
+
+
+class TailBuffer(object):
+    """
+    TailBuffer(maxlen, keep_cnts=False) is a ring buffer that behaves
+    like a deque of TailItems but keeps the points, bounding boxes,
+    rotated boxes and times of its items in arrays.
+
+    The arrays start small and double their size until maxlen as items
+    are added, so that short tails do not pay for maxlen items.
+    Only the first item (the last one added with appendleft) is kept as
+    it was given, the other items are TailItem views built from the
+    arrays. Contours are only kept if keep_cnts is True, otherwise the
+    views compute them from their rotated boxes.
+    """
+    min_size = 4  # initial size of the arrays
+
+    def __init__(self, maxlen, keep_cnts=False):
+        if maxlen is None or maxlen < 1:
+            raise ValueError("maxlen must be greater than 0")
+        self._maxlen = maxlen
+        self.keep_cnts = keep_cnts
+        self._allocate(min(maxlen, self.min_size))
+        self._start = 0  # position of the first item
+        self._len = 0
+        self._head = None  # first item as it was given
+
+    def _allocate(self, size):
+        self._size = size  # items that fit in the arrays
+        self._pts = np.empty((size, 3), np.float64)
+        self._bboxes = np.empty((size, 4), np.float64)
+        self._rboxes = np.empty((size, 5), np.float64)
+        self._times = np.empty(size, np.float64)
+        self._cnts = [None] * size
+
+    def _grow(self):
+        """
+        double the size of the arrays if they are full and smaller
+        than maxlen, keeping the items from first to last
+        """
+        if self._len < self._size or self._size == self._maxlen:
+            return
+        positions = (self._start + np.arange(self._len)) % self._size
+        pts, bboxes, rboxes = self._pts, self._bboxes, self._rboxes
+        times, cnts = self._times, self._cnts
+        self._allocate(min(2 * self._size, self._maxlen))
+        n = self._len
+        self._pts[:n] = pts[positions]
+        self._bboxes[:n] = bboxes[positions]
+        self._rboxes[:n] = rboxes[positions]
+        self._times[:n] = times[positions]
+        self._cnts[:n] = [cnts[i] for i in positions.tolist()]
+        self._start = 0
+
+    @property
+    def maxlen(self):
+        return self._maxlen
+
+    def __len__(self):
+        return self._len
+
+    def _position(self, index):
+        if index < 0:
+            index += self._len
+        if not 0 <= index < self._len:
+            raise IndexError("tail index out of range")
+        return (self._start + index) % self._size
+
+    def _write(self, pos, tail_item, time):
+        self._pts[pos] = tail_item.pt_or_nan()
+        self._bboxes[pos] = tail_item.bbox
+        (cx, cy), (sz_x, sz_y), angle = tail_item.rbox
+        self._rboxes[pos] = cx, cy, sz_x, sz_y, angle
+        self._times[pos] = np.nan if time is None else time
+        if self.keep_cnts:
+            self._cnts[pos] = tail_item.cnt
+
+    def appendleft(self, tail_item, time=None):
+        """
+        add a tail item as the first item, dropping the last one if the
+        buffer is full
+
+        :param tail_item: TailItem
+        :param time: time stamp of the item
+        """
+        self._grow()
+        self._start = (self._start - 1) % self._size
+        if self._len < self._size:
+            self._len += 1
+        self._write(self._start, tail_item, time)
+        self._head = tail_item
+
+    def append(self, tail_item, time=None):
+        """
+        add a tail item as the last item, dropping the first one if the
+        buffer is full
+
+        :param tail_item: TailItem
+        :param time: time stamp of the item
+        """
+        self._grow()
+        if self._len == self._size:
+            # first item dropped
+            self._start = (self._start + 1) % self._size
+            self._head = None
+        else:
+            self._len += 1
+        pos = (self._start + self._len - 1) % self._size
+        self._write(pos, tail_item, time)
+        if pos == self._start:
+            self._head = tail_item
+
+    def clear(self):
+        self._start = 0
+        self._len = 0
+        self._head = None
+        self._cnts = [None] * self._size
+
+    def __getitem__(self, index):
+        pos = self._position(index)
+        if pos == self._start:
+            if self._head is None:
+                self._head = self._view(pos)
+            return self._head
+        return self._view(pos)
+
+    def _view(self, pos):
+        x, y, z = self._pts[pos].tolist()
+        cx, cy, sz_x, sz_y, angle = self._rboxes[pos].tolist()
+        return TailItem(cnt=self._cnts[pos],
+                        rbox=((cx, cy), (sz_x, sz_y), angle),
+                        bbox=tuple(self._bboxes[pos].tolist()),
+                        pt=None if np.isnan(x) else (x, y, z))
+
+    def __iter__(self):
+        for i in xrange(self._len):
+            yield self[i]
+
+    def _ordered(self, array):
+        positions = (self._start + np.arange(self._len)) % self._size
+        return array[positions]
+
+    def pts(self):
+        """
+        :return: array of the points (x, y, z) from first to last item
+        """
+        return self._ordered(self._pts)
+
+    def bboxes(self):
+        """
+        :return: array of the bounding boxes from first to last item
+        """
+        return self._ordered(self._bboxes)
+
+    def rboxes(self):
+        """
+        :return: array of the rotated boxes (cx, cy, sz_x, sz_y, angle)
+            from first to last item
+        """
+        return self._ordered(self._rboxes)
+
+    def times(self):
+        """
+        :return: array of the time stamps from first to last item
+        """
+        return self._ordered(self._times)
+
+    def __repr__(self):
+        return "{}({}, maxlen={})".format(self.__class__.__name__,
+                                          list(self), self._maxlen)
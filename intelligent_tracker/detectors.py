@@ -11,13 +11,22 @@ from past.utils import old_div
 
 # import build-in modules
 import os
-from collections import deque
+from time import time
+from threading import local, Lock
+from collections import OrderedDict
+from multiprocessing.pool import ThreadPool
 
 # import third party modules
 #from RRtoolbox.lib.plotter import fastplt  # DEBUG
 #from RRtoolbox.lib.arrayops import overlay
-from .core import Space, Group, Agent, cv_major_ver, xrange, TailItem, Point
+from .core import (Space, Group, Agent, xrange, TailItem,
+                   TailItemBatch, TailBuffer, precompute)
 from .array_utils import norm_range, draw_contour_groups, is_numpy
+from .association import GridAssociation, associate
+from .trackers import TrackerBackend, default_backend
+from .tables import ObjectTable, TableColumn
+from .pools import ObjectPool
+from .candidates import CandidateBuffer
 import numpy as np
 import cv2
 
@@ -37,8 +46,10 @@ try:
     DETECTOR_PATH = cv2.data.haarcascades  # comes with "pip install opencv-contrib-python"
 except AttributeError:
     DETECTOR_PATH = os.path.join(SCRIPT_PATH, "./haarcascades/")  # "/usr/local/share/OpenCV/haarcascades/"
-face_cascade = cv2.CascadeClassifier(os.path.abspath(os.path.join(DETECTOR_PATH, 'haarcascade_frontalface_default.xml')))
-eye_cascade = cv2.CascadeClassifier(os.path.abspath(os.path.join(DETECTOR_PATH, 'haarcascade_eye.xml')))
+FACE_CASCADE_PATH = os.path.abspath(os.path.join(DETECTOR_PATH, 'haarcascade_frontalface_default.xml'))
+EYE_CASCADE_PATH = os.path.abspath(os.path.join(DETECTOR_PATH, 'haarcascade_eye.xml'))
+face_cascade = cv2.CascadeClassifier(FACE_CASCADE_PATH)
+eye_cascade = cv2.CascadeClassifier(EYE_CASCADE_PATH)
 
 
 class Detector(Space):
@@ -55,38 +66,148 @@ class Detector(Space):
         # private Detector color
         self._BGR_color = None
         self.objects = Group(_space_parent=self, name="objects")
+        # engine to associate detections with objects
+        self.association = GridAssociation()
+        # backend to track all the objects at once
+        self.tracker_backend = TrackerBackend()
+        # factory of the motion model of the objects, e.g. KalmanMotion.
+        # None to compute the direction from the tail
+        self.motion_model = None
+        # detection scheduler: detect in the full frame every
+        # full_scan_interval frames and in between only in the regions
+        # around the objects. 1 to always detect in the full frame
+        self.full_scan_interval = 1
+        self.roi_padding = 0.5  # region padding relative to object size
+        self._frame_count = 0
+        # FrameContext of the frame being computed
+        self._context = None
+        # columnar store of the objects state (see use_table)
+        self.table = None
+        # retired objects to recycle (see use_pool)
+        self.object_pool = None
+        # new detections in probation (see use_candidates)
+        self.candidates = None
+
+    def use_table(self, table=True):
+        """
+        keep the state of the objects in an ObjectTable so that they
+        are filtered with vectorized masks
+
+        :param table: ObjectTable, True to create one or None to keep
+            the state in the objects again
+        """
+        if table is True:
+            table = ObjectTable()
+        for o in self.objects:
+            if table is None:
+                o.detach_table()
+            else:
+                o.attach_table(table)
+        self.table = table
+
+    def use_pool(self, pool=True):
+        """
+        recycle the deleted stray objects as new objects instead of
+        creating them
+
+        :param pool: ObjectPool, True to create one or None to not
+            recycle objects
+        """
+        if pool is True:
+            pool = ObjectPool()
+        self.object_pool = pool
+
+    def use_candidates(self, buffer=True):
+        """
+        keep new detections as candidates until they are confirmed in
+        the next frames instead of creating an object for each of them
+
+        :param buffer: CandidateBuffer, True to create one or None to
+            create the objects at once
+        """
+        if buffer is True:
+            buffer = CandidateBuffer()
+        self.candidates = buffer
+
+    def new_object(self, frame, **kwargs):
+        """
+        create an object of the detector or recycle one from its pool
+
+        :param frame: frame where the object is
+        :param kwargs: parameters of Object
+        :return: Object
+        """
+        pool = self.object_pool
+        if pool is not None:
+            obj = pool.acquire()
+            if obj is not None:
+                return obj.recycle(frame, self, **kwargs)
+        return Object(frame=frame, parent_detector=self, **kwargs)
+
+    def retire_object(self, obj):
+        """
+        delete an object from all groups and give it to the pool
+
+        :param obj: Object of the detector
+        """
+        obj._space_delete()
+        pool = self.object_pool
+        if pool is not None:
+            pool.release(obj)
+
+    def _select(self, mask):
+        """
+        get the objects of the table in a mask that are in the objects
+        of the detector. Objects that were removed from the objects
+        without being deleted (discard, pop, clear) release their rows.
+
+        :param mask: boolean array over the rows of the table
+        :return: list of objects
+        """
+        objects = self.objects
+        selected = []
+        for o in self.table.select(mask):
+            if o in objects:
+                selected.append(o)
+            else:
+                o.detach_table()
+        return selected
 
     def active_objects(self):
         """
         :return: objects that are active regardless if they are tracking
         """
-        for o in self.objects:
-            if o.active:
-                yield o
+        table = self.table
+        if table is not None:
+            return iter(self._select(table.active))
+        return (o for o in self.objects if o.active)
 
     def inactive_objects(self):
         """
         :return: objects that are not active
         """
-        for o in self.objects:
-            if not o.active:
-                yield o
+        table = self.table
+        if table is not None:
+            return iter(self._select(~table.active))
+        return (o for o in self.objects if not o.active)
 
     def tracked_objects(self):
         """
         :return: objects that are active and are tracking
         """
-        for o in self.objects:
-            if o.active and o.is_tracking:
-                yield o
+        table = self.table
+        if table is not None:
+            return iter(self._select(table.active & table.tracking))
+        return (o for o in self.objects if o.active and o.is_tracking)
 
     def untracked_objects(self):
         """
         :return: objects that are not active or are not tracking
         """
-        for o in self.objects:
-            if not o.active or not o.is_tracking:
-                yield o
+        table = self.table
+        if table is not None:
+            return iter(self._select(~(table.active & table.tracking)))
+        return (o for o in self.objects if not o.active or not o.is_tracking)
 
     def track_objects(self, frame, mask=None):
         """
@@ -96,9 +217,23 @@ class Detector(Space):
         :param mask:
         :return:
         """
-        for o in self.objects:
-            if o.active:
-                o.update(frame, mask)
+        objects = list(self.active_objects())
+        results = self.tracker_backend.update(objects, frame)
+        for o, (is_tracking, bbox) in zip(objects, results):
+            o.tracked(frame, is_tracking, bbox, mask)
+
+    def frame_context(self, frame):
+        """
+        get the context with the derived images of the frame being
+        computed so that they are shared with other detectors
+
+        :param frame: frame given to detect_raw_objects
+        :return: FrameContext
+        """
+        context = self._context
+        if context is None or context.frame is not frame:
+            context = FrameContext(frame)
+        return context
 
     def detect_raw_objects(self, frame, mask=None):
         """To modify behaviour of detection"""
@@ -108,6 +243,109 @@ class Detector(Space):
     def filter_bad_raw_objects(self, tail_objects, frame, mask=None):
         return
 
+    def object_region(self, obj, shape):
+        """
+        get the region where an object is expected to be found
+
+        :param obj: Object
+        :param shape: shape of the frame
+        :return: x0, y0, x1, y1 clipped to the frame
+        """
+        x, y, w, h = obj.tail[0].bbox
+        pad = self.roi_padding
+        motion = obj.motion
+        if motion is not None and motion.count:
+            # expand by the predicted motion and its uncertainty
+            (dX, dY), (sX, sY) = motion.velocity[:2], motion.uncertainty[:2]
+            dX, dY = abs(dX) + 2 * sX, abs(dY) + 2 * sY
+        else:
+            # expand by the object motion
+            dX, dY = obj.dX or 0, obj.dY or 0
+        x0 = int(max(x - w * pad - abs(dX), 0))
+        y0 = int(max(y - h * pad - abs(dY), 0))
+        x1 = int(min(x + w * (1 + pad) + abs(dX), shape[1]))
+        y1 = int(min(y + h * (1 + pad) + abs(dY), shape[0]))
+        return x0, y0, x1, y1
+
+    def detection_regions(self, frame):
+        """
+        schedule where to detect in the frame
+
+        :param frame: frame to detect
+        :return: None to detect in the full frame, else list of regions
+            with format (x0, y0, x1, y1)
+        """
+        count = self._frame_count
+        self._frame_count += 1
+        interval = self.full_scan_interval
+        if not interval or interval <= 1 or count % interval == 0:
+            return None
+
+        regions = []
+        for o in self.active_objects():
+            if not o.is_tracking:
+                # tracking is not confident, look everywhere
+                return None
+            x0, y0, x1, y1 = self.object_region(o, frame.shape)
+            if x1 > x0 and y1 > y0:
+                regions.append([x0, y0, x1, y1])
+
+        # candidates must be detected again to be confirmed
+        candidates = self.candidates
+        if candidates is not None:
+            pad = self.roi_padding
+            h, w = frame.shape[:2]
+            for x, y, bw, bh in candidates.bbox:
+                x0, y0 = int(max(x - bw * pad, 0)), int(max(y - bh * pad, 0))
+                x1 = int(min(x + bw * (1 + pad), w))
+                y1 = int(min(y + bh * (1 + pad), h))
+                if x1 > x0 and y1 > y0:
+                    regions.append([x0, y0, x1, y1])
+
+        # merge overlapping regions to not detect twice
+        merged = []
+        while regions:
+            a = regions.pop()
+            for i, b in enumerate(merged):
+                if (a[0] < b[2] and b[0] < a[2] and
+                        a[1] < b[3] and b[1] < a[3]):
+                    # grown region can overlap others, merge it again
+                    del merged[i]
+                    regions.append([min(a[0], b[0]), min(a[1], b[1]),
+                                    max(a[2], b[2]), max(a[3], b[3])])
+                    break
+            else:
+                merged.append(a)
+        return [tuple(i) for i in merged]
+
+    def detect_raw_objects_in_regions(self, frame, regions, mask=None):
+        """
+        detect raw objects only inside regions of the frame
+
+        :param frame: frame to detect
+        :param regions: list of regions with format (x0, y0, x1, y1)
+        :param mask:
+        :return: raw objects in frame coordinates
+        """
+        raw_objects = []
+        context = self.frame_context(frame)
+        for x0, y0, x1, y1 in regions:
+            sub_mask = None if mask is None else mask[y0:y1, x0:x1]
+            self._context = sub_context = context.roi((x0, y0, x1, y1))
+            try:
+                found = self.detect_raw_objects(sub_context.frame, sub_mask)
+            finally:
+                self._context = context
+            if found is None:
+                continue
+            for i in found:
+                # move to frame coordinates
+                if isinstance(i, TailItem):
+                    raw_objects.append(i.shifted(x0, y0))
+                else:
+                    raw_objects.append(i + np.array((x0, y0), i.dtype))
+        return raw_objects
+
     def process_raw_objects(self, frame, tail_items, bad_items, mask=None):
         """
         create new object or reuse object from a tail_item
@@ -127,61 +365,45 @@ class Detector(Space):
         active_objects_dic = {i:([],[]) for i in self.active_objects()}
         # unclassified
         unclassified = []
+        new_items = []
 
-        # classify all tail_items with objects
-        for ti in tail_items:
-            near_flag = False
-            for o, (inside, near) in active_objects_dic.items():
-                # find out if cnt overlaps with objects from this detector
-                # faster check
-                if o.tail[0].point_inside(ti):
-                    # tail_item inside Object
-                    # do not let object tracker grow too much
-                    #o.update_tracker(frame, tail_item=ti)
-                    inside.append(ti)
-                    break
-                elif ti.point_inside(o.position):
-                    # Object inside tail_item
-                    # if object lost track and it was detected again
-                    #o.update_tracker(frame, tail_item=ti)
-                    inside.append(ti)
-                    break
-                #elif o.tail[0].cnt_intersect(ti):  # covered by cnt_near
-                #    # Object and tail_item touch
-                #    break
-                else:
-                    flag, dist = o.tail[0].cnt_near(ti)
-                    if flag:
-                        # it is near an object do not create new
-                        near_flag = True
-
-                        # append to near raw_objects of object
-                        #near.append(ti)
+        # index objects once per frame so that each tail_item is only
+        # compared with the objects around it
+        engine = self.association
+        engine.build(active_objects_dic, [o.tail[0] for o in active_objects_dic])
 
-                        # continue finding objects that could contain the raw_obejct
-                        continue
-            else:
-                if not near_flag and ti not in bad_items:
-                    # create new object only if raw_object is not any of the
-                    # objects that are being tracked
-                    o = Object(frame=frame, parent_detector=self,
-                               tail_item=ti, mask=mask)
-                    self.objects.add_as_contained(o)
-                    unclassified.append(o)
+        # classify all tail_items with objects
+        for ti, (o, near_flag) in zip(tail_items, associate(engine, tail_items)):
+            if o is not None:
+                # tail_item inside Object or Object inside tail_item
+                # do not let object tracker grow too much
+                #o.update_tracker(frame, tail_item=ti)
+                active_objects_dic[o][0].append(ti)
+            elif not near_flag and ti not in bad_items:
+                # create new object only if raw_object is not any of the
+                # objects that are being tracked
+                new_items.append(ti)
+
+        # new objects only from the confirmed candidates
+        candidates = self.candidates
+        if candidates is not None:
+            new_items = candidates.update(new_items)
 
         # create or reuse objects as needed
-        #for ti in unclassified:
-        #    o = Object(frame=frame, parent_detector=self,
-        #               tail_item=ti, mask=mask)
-        #    self.objects.add_as_contained(o)
+        for ti in new_items:
+            o = self.new_object(frame, tail_item=ti, mask=mask)
+            self.objects.add_as_contained(o)
+            unclassified.append(o)
         for o, (inside, near) in active_objects_dic.items():
             if not inside:
                 if not o.is_tracking:
                     o._stray_count += 1
             else:
                 # group tail items and update tracker
-                cont = np.vstack(inside)
-                hull = cv2.convexHull(cont)
+                if len(inside) == 1:
+                    hull = inside[0].hull
+                else:
+                    hull = cv2.convexHull(np.vstack(inside))
                 o.update_tracker(frame, cnt=hull)
 
         return unclassified
@@ -190,14 +412,19 @@ class Detector(Space):
         """
         delete all objects that are missing the correct target
         """
+        table = self.table
+        if table is not None:
+            for o in self._select(table.stray_mask()):
+                self.retire_object(o)  # delete from all groups
+            return
         objects = self.objects
         for o in objects:
             if (o.active and not o.live_forever and
                         o._stray_count > o._max_stray_count):
-                o._space_delete()  # delete from all groups
+                self.retire_object(o)  # delete from all groups
 
     def _compute_objects(self, frame, mask=None, track=True, _debug_good=None,
-                         _debug_bad=None):
+                         _debug_bad=None, context=None):
         """
         complete steps to detect and process objects
 
@@ -205,13 +432,25 @@ class Detector(Space):
         :param mask:
         :param track:
         :param _debug_good:
+        :param context: FrameContext of frame shared with other detectors
         :return:
         """
         # example code
         if track:
             self.track_objects(frame, mask)
         # get raw objects from frame
-        raw_objects = self.detect_raw_objects(frame, mask)
+        if context is None or context.frame is not frame:
+            context = FrameContext(frame)
+        self._context = context
+        try:
+            regions = self.detection_regions(frame)
+            if regions is None:
+                raw_objects = self.detect_raw_objects(frame, mask)
+            else:
+                raw_objects = self.detect_raw_objects_in_regions(
+                    frame, regions, mask)
+        finally:
+            self._context = None
 
         # if there are raw objects to process
         if raw_objects is not None:
@@ -243,6 +482,16 @@ class Detector(Space):
             self.delete_stray_objects()
 
             return objs
+        elif self.candidates is not None:
+            # candidates expire in frames without detections too
+            self.candidates.update([])
+
+    def close(self):
+        """
+        release the resources of the detector like threads. It can be
+        used again after closing it.
+        """
+        self.tracker_backend.close()
 
     def get_BGR_color(self):
         """
@@ -292,19 +541,20 @@ class Detector(Space):
         vis[mask > 0] = (vis * 0.5 + a * 0.5)[mask > 0].astype(np.uint8)
 
 
-def affine(phi, img):
+def affine_transform(phi, shape):
     """
-    Increase robustness to descriptors by calculating other invariant perspectives to image.
+    Calculate the rotation that affine applies to an image of a given
+    shape without warping it.
 
     :param phi: rotation of image (in degrees)
-    :param img: image to find Affine transforms
-    :param mask: mask to detect keypoints (it uses default, mask[:] = 255)
-    :return: skew_img, skew_mask, Ai (invert Affine Transform)
+    :param shape: shape of the image
+    :return: A, (w, h), Ai
 
+    A - is an affine transform matrix from img to skew_img
+    (w, h) - is the size of skew_img
     Ai - is an affine transform matrix from skew_img to img
-
     """
-    h, w = img.shape[:2]  # get 2D shape
+    h, w = shape[:2]  # get 2D shape
     A = np.float32([[1, 0, 0], [0, 1, 0]])  # init Transformation matrix
     if phi != 0.0:  # simulate rotation
         phi = np.deg2rad(phi)  # convert degrees to radian
@@ -316,18 +566,353 @@ def affine(phi, img):
         x, y, w, h = cv2.boundingRect(
             tcorners.reshape(1, -1, 2))  # get translations
         A = np.hstack([A, [[-x], [-y]]])  # finish Transformation matrix build
-        img = cv2.warpAffine(
-            img, A, (w, h), flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
-
-        h, w = img.shape[:2]  # get new 2D shape
     Ai = cv2.invertAffineTransform(A)
+    return A, (w, h), Ai
+
+
+def affine(phi, img):
+    """
+    Increase robustness to descriptors by calculating other invariant perspectives to image.
+
+    :param phi: rotation of image (in degrees)
+    :param img: image to find Affine transforms
+    :param mask: mask to detect keypoints (it uses default, mask[:] = 255)
+    :return: skew_img, skew_mask, Ai (invert Affine Transform)
+
+    Ai - is an affine transform matrix from skew_img to img
+
+    """
+    A, size, Ai = affine_transform(phi, img.shape)
+    if phi != 0.0:  # simulate rotation
+        img = cv2.warpAffine(
+            img, A, size, flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
     return img, Ai
 
 
+def merge_rotated_boxes(rboxes, overlap=0.3, weights=None):
+    """
+    Collapse duplicated rotated boxes by clustering the ones that
+    overlap and merging each cluster into its weighted average box.
+
+    The overlap is measured as the intersection over union of the
+    axis-aligned extents of the box corners. Clusters are formed
+    greedily starting from the box with the highest weight.
+
+    :param rboxes: array of N rotated boxes with format
+        (cx, cy, sz_x, sz_y, angle)
+    :param overlap: minimum intersection over union to merge two boxes
+    :param weights: weight of each box. If None all boxes weight the same.
+        Clusters whose weights do not add up to a positive number are
+        merged into their unweighted average box
+    :return: array of M <= N merged rotated boxes
+    """
+    rboxes = np.asarray(rboxes, np.float64).reshape(-1, 5)
+    if len(rboxes) < 2:
+        return rboxes
+    if weights is None:
+        weights = np.ones(len(rboxes))
+    else:
+        weights = np.asarray(weights, np.float64).reshape(-1)
+
+    # axis-aligned extents of the corners
+    cnts = Agent.get_cnts_from_rotated_boxes(rboxes, None)
+    lower, upper = cnts.min(axis=(1, 2)), cnts.max(axis=(1, 2))
+    areas = np.prod(upper - lower, 1)
+    # intersection over union of all pairs
+    sides = np.clip(np.minimum(upper[:, None], upper[None]) -
+                    np.maximum(lower[:, None], lower[None]), 0, None)
+    inter = np.prod(sides, 2)
+    union = areas[:, None] + areas[None] - inter
+    iou = inter / np.where(union > 0, union, 1)
+
+    merged = []
+    free = np.ones(len(rboxes), bool)
+    # stable to keep the order of the boxes with the same weight
+    for seed in np.argsort(-weights, kind="mergesort"):
+        if not free[seed]:
+            continue
+        cluster = free & (iou[seed] > overlap)
+        cluster[seed] = True
+        free &= ~cluster
+        w = weights[cluster]
+        if w.sum() > 0:
+            merged.append(np.dot(w, rboxes[cluster]) / w.sum())
+        else:
+            # zero or negative weights cannot be averaged
+            merged.append(rboxes[cluster].mean(0))
+    return np.array(merged)
+
+
+class FrameContext(object):
+    """
+    Derived images of a frame that are computed only once when they
+    are first asked and then shared by all the detectors of a scene.
+
+    A context of a region of the frame (see FrameContext.roi) takes the
+    images that do not change with cropping (gray, hsv, blurred) from
+    its parent context instead of computing them again.
+    """
+
+    def __init__(self, frame, parent=None, region=None):
+        """
+        :param frame: BGR image
+        :param parent: context of the frame the region was cropped from
+        :param region: region (x0, y0, x1, y1) of frame in the parent
+        """
+        self.frame = frame
+        self.parent = parent
+        self.region = region
+        self._images = {}
+
+    def _memo(self, key, func, shared=True):
+        """
+        get a memoized image
+
+        :param key: key to identify the image
+        :param func: function called with the context to compute it
+        :param shared: True if the image of a region can be cropped from
+            the image of the parent
+        :return: image
+        """
+        try:
+            return self._images[key]
+        except KeyError:
+            if shared and self.parent is not None:
+                x0, y0, x1, y1 = self.region
+                img = self.parent._memo(key, func)[y0:y1, x0:x1]
+            else:
+                img = func(self)
+            self._images[key] = img
+            return img
+
+    def roi(self, region):
+        """
+        get the context of a region of the frame
+
+        :param region: x0, y0, x1, y1
+        :return: FrameContext
+        """
+        x0, y0, x1, y1 = region
+        return FrameContext(self.frame[y0:y1, x0:x1], self, region)
+
+    @property
+    def root(self):
+        """
+        :return: context of the full frame the regions were cropped from
+        """
+        context = self
+        while context.parent is not None:
+            context = context.parent
+        return context
+
+    def gray(self):
+        """
+        :return: gray image
+        """
+        def func(context):
+            frame = context.frame
+            if frame.ndim == 2:
+                return frame
+            return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        return self._memo("gray", func)
+
+    def blurred(self, ksize=(11, 11), sigma=0):
+        """
+        :param ksize: Gaussian kernel size
+        :param sigma: Gaussian kernel standard deviation
+        :return: blurred image
+        """
+        def func(context):
+            return cv2.GaussianBlur(context.frame, ksize, sigma)
+        return self._memo(("blurred", ksize, sigma), func)
+
+    def hsv(self, ksize=None, sigma=0):
+        """
+        :param ksize: Gaussian kernel size to blur the frame before the
+            conversion. None to not blur it.
+        :param sigma: Gaussian kernel standard deviation
+        :return: HSV image
+        """
+        def func(context):
+            frame = context.frame
+            if ksize is not None:
+                frame = context.blurred(ksize, sigma)
+            return cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
+        return self._memo(("hsv", ksize, sigma), func)
+
+    def pyramid(self, level, kind="frame"):
+        """
+        :param level: level of the pyramid where 0 is the image itself
+            and each level is half the size of the previous one
+        :param kind: image to downscale, "frame" or "gray"
+        :return: downscaled image
+        """
+        if level <= 0:
+            return self.frame if kind == "frame" else getattr(self, kind)()
+
+        def func(context):
+            return cv2.pyrDown(context.pyramid(level - 1, kind))
+        return self._memo(("pyramid", level, kind), func, shared=False)
+
+    def rotated(self, angle, kind="gray", warp=None):
+        """
+        :param angle: rotation (in degrees)
+        :param kind: image to rotate, "frame" or "gray"
+        :param warp: function called as warp(angle, img) to rotate the
+            image, e.g. InvariantCascade.warp to reuse the transformations
+            of previous frames. None to use affine
+        :return: rotated image, Ai (invert Affine Transform)
+        """
+        if warp is None:
+            warp = affine
+
+        def func(context):
+            img = context.pyramid(0, kind)
+            return warp(angle, img)
+        return self._memo(("rotated", angle, kind), func, shared=False)
+
+
 class InvariantCascade(object):
+    """
+    Run a cascade classifier over rotated copies of a frame to detect
+    objects at several angles.
 
-    def __init__(self, angles=None):
+    The angle passes run concurrently in a pool of threads because
+    OpenCV releases the GIL. A cv2.CascadeClassifier is not thread safe,
+    so every thread loads and owns its own classifier from cascade_path.
+    """
+
+    def __init__(self, angles=None, cascade_path=None, processes=None,
+                 max_shapes=4):
+        """
+        :param angles: angles (in degrees) to rotate the frame
+        :param cascade_path: path to the cascade classifier file
+        :param processes: number of threads to run the angle passes.
+            If None it is the number of angles, if 1 the passes are run
+            serially in the calling thread.
+        :param max_shapes: frame shapes to keep the transformations and
+            destination images of, the least recently used are dropped
+            (regions of the frame have many shapes)
+        """
         self.angles = angles
+        self.cascade_path = cascade_path
+        self.processes = processes
+        self.max_shapes = max_shapes
+        self._local = local()
+        self._pool = None
+        # transformations of each (shape, angle)
+        self._transforms = OrderedDict()
+        # destination images of each (shape, dtype, angle)
+        self._buffers = OrderedDict()
+        self._cache_lock = Lock()  # passes warp in several threads
+
+    def cascade(self):
+        """
+        :return: cascade classifier owned by the calling thread
+        """
+        cascade = getattr(self._local, "cascade", None)
+        if cascade is None:
+            cascade = cv2.CascadeClassifier(self.cascade_path)
+            if cascade.empty():
+                raise IOError("cascade '{}' could not be "
+                              "loaded".format(self.cascade_path))
+            self._local.cascade = cascade
+        return cascade
+
+    def warp(self, angle, frame):
+        """
+        rotate a frame like affine but reusing the transformation
+        and the destination image computed for previous frames of the
+        same shape.
+
+        .. warning:: the returned image is overwritten the next time a
+            frame of the same shape and type is warped with this angle
+
+        :param angle: rotation of frame (in degrees)
+        :param frame: image to rotate
+        :return: rotated frame, Ai (invert Affine Transform)
+        """
+        shape = frame.shape
+        key = (shape[:2], angle)
+        transform = self._cached(self._transforms, key)
+        if transform is None:
+            transform = affine_transform(angle, shape)
+            self._cache(self._transforms, key, transform)
+        A, size, Ai = transform
+        if angle == 0.0:
+            return frame, Ai
+        key = (shape, frame.dtype, angle)
+        dst = self._cached(self._buffers, key)
+        dst = cv2.warpAffine(frame, A, size, dst=dst, flags=cv2.INTER_LINEAR,
+                             borderMode=cv2.BORDER_REPLICATE)
+        self._cache(self._buffers, key, dst)
+        return dst, Ai
+
+    def _cached(self, cache, key):
+        # value of a key as the most recently used or None
+        with self._cache_lock:
+            value = cache.pop(key, None)
+            if value is not None:
+                cache[key] = value
+            return value
+
+    def _cache(self, cache, key, value):
+        # keep the values of the max_shapes most recently used shapes
+        with self._cache_lock:
+            cache[key] = value
+            limit = self.max_shapes * max(len(self.angles or ()), 1)
+            while len(cache) > limit:
+                cache.popitem(last=False)
+
+    def _pass(self, args):
+        """
+        detect objects in a frame rotated by angle
+
+        :param args: (angle, frame, context, detection keyword arguments)
+        :return: rotated boxes in the frame
+        """
+        angle, frame, context, kwargs = args
+        if context is None:
+            img, Ai = self.warp(angle, frame)
+        else:
+            img, Ai = context.rotated(angle, warp=self.warp)
+        bboxes = self.cascade().detectMultiScale(img, **kwargs)
+        return self.reconstruct_many(Ai, angle, bboxes)
+
+    def detect(self, frame, context=None, **kwargs):
+        """
+        detect objects in all the angles
+
+        :param frame: gray image
+        :param context: FrameContext of frame to share the rotated images
+            with other detectors. None to rotate frame in own buffers.
+        :param kwargs: keyword arguments for detectMultiScale
+        :return: array of N rotated boxes with format
+            (cx, cy, sz_x, sz_y, angle) in the order of the angles
+        """
+        if context is not None:
+            frame = context.gray()
+        tasks = [(angle, frame, context, kwargs) for angle in self.angles]
+        processes = self.processes
+        if processes is None:
+            processes = len(tasks)
+        if processes <= 1 or len(tasks) <= 1:
+            results = [self._pass(i) for i in tasks]
+        else:
+            if self._pool is None:
+                self._pool = ThreadPool(processes)
+            # map keeps the order of the angles
+            results = self._pool.map(self._pass, tasks)
+        return np.vstack(results + [np.zeros((0, 5))])
+
+    def close(self):
+        """
+        close the pool of threads
+        """
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
 
     def transformations(self, frame):
         #cols, rows = frame.shape[:2]
@@ -338,7 +923,7 @@ class InvariantCascade(object):
             #cols2, rows2 = np.dot(M, (cols, rows, 1))
             #M = np.array(((np.cos(angle), np.sin(angle), 0), (-np.sin(angle), np.cos(angle), 0)))
             #yield M, angle, cv2.warpAffine(frame, M, (int(cols2), int(rows2)))
-            img, Ai = affine(angle, frame)
+            img, Ai = self.warp(angle, frame)
             yield Ai, angle, img
 
     def reconstruct(self, Ai, angle, bbox):
@@ -348,13 +933,33 @@ class InvariantCascade(object):
         xn, yn = np.dot(Ai, (x, y, 1))
         return Agent.get_rotated_box_from_bounding_box((xn, yn, sz_x, sz_y))[:-1]+(-angle,)
 
+    def reconstruct_many(self, Ai, angle, bboxes):
+        """
+        vectorized reconstruct
+
+        :param Ai: invert Affine Transform
+        :param angle: angle of transformation
+        :param bboxes: array of N bounding boxes in the transformed image
+        :return: array of N rotated boxes with format
+            (cx, cy, sz_x, sz_y, angle) in the original image
+        """
+        bboxes = np.asarray(bboxes, np.float64).reshape(-1, 4)
+        rboxes = np.empty((len(bboxes), 5), np.float64)
+        rboxes[:, :2] = np.dot(bboxes[:, :2], Ai[:, :2].T) + Ai[:, 2]
+        rboxes[:, 2:4] = bboxes[:, 2:4]
+        rboxes[:, :2] += bboxes[:, 2:4] / 2.
+        rboxes[:, 4] = -angle
+        return rboxes
+
 
 class EyeDetector(Detector):
     def detect_raw_objects(self, frame, mask=None):
         min_size = 0.1
         max_size = 0.5
-        h, w = frame.shape[:2]
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        context = self.frame_context(frame)
+        # eyes are as big in a region as in the full frame
+        h, w = context.root.frame.shape[:2]
+        gray = context.gray()
         # http://answers.opencv.org/question/116587/rejectlevels-and-levelweights-of-detectmultiscale/
         eyes = eye_cascade.detectMultiScale(gray,
                                             minSize=(int(w * min_size),
@@ -363,36 +968,51 @@ class EyeDetector(Detector):
                                                      int(h * max_size)),
                                             flags=cv2.CASCADE_SCALE_IMAGE)
 
-        return [TailItem(bbox=bbox) for bbox in eyes]
+        return TailItemBatch(bboxes=eyes).items()
 
 Detector.register_detector(EyeDetector)
 
 
 class FaceDetector(Detector):
+
+    def __init__(self, angles=(0, 20, 40, -20, -40), processes=None,
+                 merge_overlap=0.3):
+        """
+        :param angles: angles (in degrees) to detect rotated faces
+        :param processes: number of threads to detect the angles
+        :param merge_overlap: minimum overlap to merge the duplicated
+            faces found in several angles. None to keep all of them.
+        """
+        super(FaceDetector, self).__init__()
+        # TODO complete invariance
+        self.cascade = InvariantCascade(list(angles), FACE_CASCADE_PATH,
+                                        processes)
+        self.merge_overlap = merge_overlap
+
+    def close(self):
+        super(FaceDetector, self).close()
+        self.cascade.close()
+
     def detect_raw_objects(self, frame, mask=None):
         min_scale = 0.05  # 0.1
-        h, w = frame.shape[:2]
+        context = self.frame_context(frame)
+        # faces are as big in a region as in the full frame
+        h, w = context.root.frame.shape[:2]
         minSize = (int(w * min_scale), int(h * min_scale))
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
         # https://stackoverflow.com/a/20805153/5288758
         # https://stackoverflow.com/a/22250382/5288758
         #faces = face_cascade.detectMultiScale(gray, minSize=minSize,
         #                                      scaleFactor=1.2, minNeighbors=6,
         #                                      flags=cv2.CASCADE_SCALE_IMAGE)
         #normal = [TailItem(bbox=bbox) for bbox in faces]
-        # TODO complete invariance
-        normal = []
-        to_rotate = InvariantCascade([0, 20, 40, -20, -40])
-        #to_rotate = InvariantCascade([10])
-        for M, i, f in to_rotate.transformations(gray):
-            faces = face_cascade.detectMultiScale(f, minSize=minSize,
-                                                  scaleFactor=1.3,
-                                                  minNeighbors=5,
-                                                  flags=cv2.CASCADE_SCALE_IMAGE)
-
-            normal.extend([TailItem(rbox=to_rotate.reconstruct(M, i, bbox)) for bbox in faces])
-
-        return normal
+        rboxes = self.cascade.detect(context.gray(), context,
+                                     minSize=minSize, scaleFactor=1.3,
+                                     minNeighbors=5,
+                                     flags=cv2.CASCADE_SCALE_IMAGE)
+        if self.merge_overlap is not None:
+            # the same face is found in several angles
+            rboxes = merge_rotated_boxes(rboxes, self.merge_overlap)
+        return TailItemBatch(rboxes=rboxes).items()
 
 Detector.register_detector(FaceDetector)
 
@@ -456,8 +1076,7 @@ class ColorDetector(Detector):
                             cv2.COLOR_BGR2HSV)[0, 0]
 
     def detect_raw_objects(self, frame, mask=None):
-        blurred = cv2.GaussianBlur(frame, (11, 11), 0)
-        hsv = cv2.cvtColor(blurred, cv2.COLOR_BGR2HSV)
+        hsv = self.frame_context(frame).hsv((11, 11))
 
         # construct a mask for the color, then perform a series of dilation
         # and erosion operations to remove any small blobs left in it
@@ -478,14 +1097,11 @@ class ColorDetector(Detector):
         #z_must_be = np.min(frame.shape[:2])/ignore_z  # z as radius
         z_must_be = frame.shape[0]*frame.shape[1]*ignore_z  # z as area
         bad_objects = []
+        # complete more data in tail items
+        precompute(tail_objects, ("pt",))
         for ti in tail_objects:
             #((x, y), z) = cv2.minEnclosingCircle(cnt)  # z as radius
-            M = cv2.moments(ti.cnt)
-            z = M["m00"]  # z as area
-            x, y = (int(old_div(M["m10"], M["m00"])),
-                    int(old_div(M["m01"], M["m00"])))
-            # complete more data in tail item
-            ti._pt = Point(*(x, y, z))
+            x, y, z = ti.pt  # z as area
 
             if mask is not None:
                 # find out if cnt overlaps with objects from other detectors
@@ -513,27 +1129,59 @@ class Object(Agent):
     It is any entity in the World that has its own characteristics or
     features and that can be tracked in the real world.
     """
+    # state kept in the ObjectTable of the detector if it uses one
+    active = TableColumn("active", True)
+    _is_tracking = TableColumn("tracking", False)
+    live_forever = TableColumn("live_forever", False)
+    _stray_count = TableColumn("stray", 0)
+    _max_stray_count = TableColumn("max_stray", 10)
+    _table_columns = (active, _is_tracking, live_forever, _stray_count,
+                      _max_stray_count)
+    # objects are created for each detection
+    __slots__ = ('_table', '_table_row', '_dX', '_dY', '_dZ', '_BGR_color',
+                 'key_pts', 'descriptors', '_direction_cover', 'tail',
+                 'tracker_type', 'tracker', '_in_zones', 'motion', '_recycled'
+                 ) + tuple(c.attr for c in _table_columns)
+
     def __init__(self, frame, parent_detector,
                  max_tail_len=30, tracker_type='MEDIANFLOW', key_pts=None,
                  descriptors=None, **kwargs):
+        # not in an ObjectTable until attach_table
+        self._table = self._table_row = None
         super(Object, self).__init__()
         self._space_parent = parent_detector
+        self._recycled = 0  # times the object was recycled
+        self.tail = None  # TailBuffer containing points
+        self.tracker_type = self.tracker = None
+        self.motion = None
+        self._start(frame, parent_detector, max_tail_len, tracker_type,
+                    key_pts, descriptors, **kwargs)
+
+    def _start(self, frame, parent_detector, max_tail_len, tracker_type,
+               key_pts, descriptors, **kwargs):
+        """
+        initialize the state of the object from its first data
+        """
         # private position deltas
         (self._dX, self._dY, self._dZ) = (None, None, None)
         # private object color
         self._BGR_color = None
         # private flag to recompute positions and tracked object
-        self._to_recompute = True
+        self._to_compute = True
         # unique features of object
         self.key_pts = key_pts  # key points for descriptors
         self.descriptors = descriptors  # descriptions for unique object
-        # create deques
+        # create tails
         self._direction_cover = 10  # last points to use to calculate direction
-        self.tail = None  # deque containing points
-        self.max_tail_len = max_tail_len  # maximum cached points in tail
-        # tracker mechanism
+        if self.tail is not None and self.tail.maxlen == max_tail_len:
+            self.tail.clear()  # recycled tail
+        else:
+            self.max_tail_len = max_tail_len  # maximum cached points in tail
+        # tracker mechanism, a recycled tracker of the same type is
+        # initialized again by the backend
+        if tracker_type != self.tracker_type:
+            self.tracker = None
         self.tracker_type = tracker_type
-        self.tracker = None
         self._is_tracking = False
         # to delete stray objects
         self._stray_count = 0
@@ -541,12 +1189,82 @@ class Object(Agent):
         self.live_forever = False  # do not let stray count to delete object
         # to detect zones where the object passes
         self._in_zones = []
+        # motion model updated with each point of the tail
+        motion_model = getattr(parent_detector, "motion_model", None)
+        if motion_model is None:
+            self.motion = None
+        elif type(self.motion) is motion_model:
+            self.motion.reset()  # recycled motion model
+        else:
+            self.motion = motion_model()
+        # become a handle into the table of the detector
+        table = getattr(parent_detector, "table", None)
+        if table is not None:
+            self.attach_table(table)
 
         # first data
         self.add_to_tail(**kwargs)
         # update tracker
         self.update_tracker(frame)
 
+    def recycle(self, frame, parent_detector, max_tail_len=30,
+                tracker_type='MEDIANFLOW', key_pts=None, descriptors=None,
+                **kwargs):
+        """
+        start a deleted object again as a new object with a new name.
+        Its tail, tracker and motion model are reused if they fit.
+
+        :param frame: frame where the object is
+        :param parent_detector: Detector of the new object
+        :param kwargs: same as Object
+        :return: self
+        """
+        if self._space_parent_ is not None or self._space_name_handles:
+            raise ValueError("only objects deleted from the Space can be "
+                             "recycled")
+        self._recycled += 1
+        # not to be confused with the object it was
+        self._name = "{}-{}".format(id(self), self._recycled)
+        self._space_entities[self._name] = self
+        self._space_parent = parent_detector
+        self.tracker_backend().reset(self)
+        super(Object, self).__init__()
+        self._start(frame, parent_detector, max_tail_len, tracker_type,
+                    key_pts, descriptors, **kwargs)
+        return self
+
+    def attach_table(self, table):
+        """
+        keep the state of the object in a row of an ObjectTable
+
+        :param table: ObjectTable
+        """
+        self.detach_table()
+        values = [c.__get__(self) for c in self._table_columns]
+        self._table_row = table.add(self)
+        self._table = table
+        for c, v in zip(self._table_columns, values):
+            c.__set__(self, v)
+        if self.tail:
+            table.set_tail_item(self._table_row, self.tail[0])
+
+    def detach_table(self):
+        """
+        keep the state of the object in itself and release its row
+        """
+        table = self._table
+        if table is None:
+            return
+        values = [c.__get__(self) for c in self._table_columns]
+        table.release(self._table_row)
+        self._table = self._table_row = None
+        for c, v in zip(self._table_columns, values):
+            c.__set__(self, v)
+
+    def _space_delete(self):
+        self.detach_table()
+        super(Object, self)._space_delete()
+
     @property
     def cnt(self):
         return self.tail[0].cnt
@@ -603,15 +1321,16 @@ class Object(Agent):
         if old_len != new_len:
             c_len = min([old_len, new_len])  # where tails can be merged
             cached_tail = self.tail  # old tail
-            self.tail = deque(maxlen=new_len)  # new tail
+            self.tail = TailBuffer(new_len)  # new tail
             if cached_tail:  # either if None or no tail items
+                times = cached_tail.times().tolist()
                 for i, p in enumerate(cached_tail):
                     if i > c_len:
                         # break if either, old or new, lack
                         # the next tail items
                         break
-                    # add from last tail items
-                    self.tail.append(p)
+                    # add from last tail items with their time
+                    self.tail.append(p, times[i])
 
     @property
     def is_tracking(self):
@@ -621,9 +1340,12 @@ class Object(Agent):
     def is_tracking(self, value):
         if value and not self._is_tracking:
             # tracking again then clean path
-            last = self.tail[0]
+            last, last_time = self.tail[0], self.tail.times()[0]
             self.tail.clear()
-            self.tail.append(last)
+            self.tail.append(last, last_time)
+            if self.motion is not None:
+                self.motion.reset()
+                self._update_motion(last)
 
         self._is_tracking = value
 
@@ -705,8 +1427,12 @@ class Object(Agent):
             tf = kwargs["tail_item"]
         except KeyError:
             tf = TailItem(*args, **kwargs)
-        self.tail.appendleft(tf)
-        self._to_recompute = True
+        self.tail.appendleft(tf, time())
+        self._to_compute = True
+        if self._table is not None:
+            self._table.set_tail_item(self._table_row, tf)
+        if self.motion is not None:
+            self._update_motion(tf)
         # update key_points and descriptors
         if frame is not None:
             self._update_description(frame, tf)
@@ -715,6 +1441,17 @@ class Object(Agent):
         return tf
     add_to_tail.__doc__ = add_to_tail.__doc__.format(TailItem._fields)
 
+    def _update_motion(self, tail_item):
+        """
+        correct the motion model with the point of a tail item if it
+        has one (contours without area do not)
+
+        :param tail_item: TailItem
+        """
+        pt = tail_item.pt_or_nan()
+        if np.isfinite(pt).all():
+            self.motion.update(pt)
+
     def _update_description(self, frame, tail_item):
         return
 
@@ -791,7 +1528,32 @@ class Object(Agent):
 
         return "-".join((dirX, dirY, dirZ))
 
+    def predicted_bbox(self, steps=1):
+        """
+        get where the object is expected to be
+
+        :param steps: frames ahead
+        :return: last bounding box moved to the position predicted by the
+            motion model, or the last bounding box if there is no model
+        """
+        x, y, w, h = self.tail[0].bbox
+        motion = self.motion
+        if motion is None or not motion.count:
+            return x, y, w, h
+        cx, cy = motion.predict(steps)[:2]
+        return cx - w / 2., cy - h / 2., w, h
+
     def _compute(self):
+        motion = self.motion
+        if motion is not None:
+            if motion.count < 2:
+                return  # still to compute, nothing done
+            # displacement over the points covered by the direction
+            v = motion.velocity * self._direction_cover
+            self._dX, self._dY, self._dZ = [int(i) for i in v]
+            self._to_compute = False  # computed
+            return
+
         # check there are enough points
         tail = self.tail
         if not self._enough_items(len(tail)):
@@ -801,38 +1563,27 @@ class Object(Agent):
         # how many points to cover
         #average = np.average([np.array(tail[i]) for i in np.arange(cover)], 0)
         #rolled = np.average([np.array(tail[-i-1]) for i in np.arange(cover)], 0)
-        average = (np.sum(np.array([np.array(tail[i].pt)*(cover-i)
-                                   for i in xrange(cover)]), 0)
-                   / np.sum(np.arange(cover) + 1))
-        rolled = (np.sum(np.array([np.array(tail[-i-1].pt)*(cover-i)
-                                 for i in xrange(cover)]), 0)
-                / np.sum(np.arange(cover) + 1))
+        pts = tail.pts()
+        weights = cover - np.arange(cover)
+        average = np.dot(weights, pts[:cover]) / np.sum(weights)
+        rolled = np.dot(weights, pts[::-1][:cover]) / np.sum(weights)
+        delta = average - rolled
+        if not np.all(np.isfinite(delta)):
+            return  # points without area
         # compute the difference between the x and y coordinates
-        self._dX, self._dY, self._dZ = [int(i) for i in (average - rolled)]
-        self._to_recompute = False  # computed
+        self._dX, self._dY, self._dZ = [int(i) for i in delta]
+        self._to_compute = False  # computed
 
-    def update_tracker(self, frame, mask=None, tracker_type=None, **kwargs):
-        if tracker_type is None:
-            tracker_type = self.tracker_type
-
-        tk_name = tracker_type.upper()
-        if int(cv_major_ver) < 3:
-            tracker = cv2.Tracker_create(tk_name)
-        elif tk_name == 'BOOSTING':
-            tracker = cv2.TrackerBoosting_create()
-        elif tk_name == 'MIL':
-            tracker = cv2.TrackerMIL_create()
-        elif tk_name == 'KCF':
-            tracker = cv2.TrackerKCF_create()
-        elif tk_name == 'TLD':
-            tracker = cv2.TrackerTLD_create()
-        elif tk_name == 'MEDIANFLOW':
-            tracker = cv2.TrackerMedianFlow_create()
-        elif tk_name == 'GOTURN':
-            tracker = cv2.TrackerGOTURN_create()
-        else:
-            raise ValueError("tracker_type not supported")
+    def tracker_backend(self):
+        """
+        :return: TrackerBackend of the parent detector
+        """
+        backend = getattr(self._space_parent, "tracker_backend", None)
+        if backend is None:
+            return default_backend
+        return backend
 
+    def update_tracker(self, frame, mask=None, tracker_type=None, **kwargs):
         # add tail if tracker was created
         if kwargs:
             # renewing tracker and correct it
@@ -842,15 +1593,26 @@ class Object(Agent):
             tf = self.tail[0]
 
         # register new tracker if tail was added successfully
-        self.tracker_type = tracker_type
-        self.tracker = tracker
-        self.is_tracking = tracker.init(frame, tf.bbox)
+        self.is_tracking = self.tracker_backend().init(self, frame, tf.bbox,
+                                                       tracker_type)
+
+    def tracked(self, frame, is_tracking, bbox, mask=None):
+        """
+        register the result of tracking the object in a new frame
+
+        :param frame: new frame
+        :param is_tracking: True if the object was found
+        :param bbox: bounding box where the object was found
+        :param mask:
+        """
+        self.is_tracking = is_tracking
+        if is_tracking:
+            self.add_to_tail(mask=mask, frame=frame, bbox=bbox)
 
     def update(self, frame, mask=None):
         # Update tracker
-        self.is_tracking, bbox = self.tracker.update(frame)
-        if self.is_tracking:
-            self.add_to_tail(mask=mask, frame=frame, bbox=bbox)
+        is_tracking, bbox = self.tracker_backend().update([self], frame)[0]
+        self.tracked(frame, is_tracking, bbox, mask)
 
     def draw_circle(self, frame, color=None):
         # draw the circle and centroid on the frame,
@@ -861,7 +1623,7 @@ class Object(Agent):
             color = norm_range(color)
         try:
             x, y, _ = self.position
-            (_, radius) = cv2.minEnclosingCircle(self.tail[0].cnt)
+            (_, radius) = self.tail[0].enclosing_circle()
             center = (int(x), int(y))
             cv2.circle(frame, center, int(radius), color, 2)
             cv2.circle(frame, center, 5, norm_range([255-i for i in color]), -1)
@@ -884,15 +1646,18 @@ class Object(Agent):
         tail = self.tail
         if iterate is None:
             iterate = xrange(1, len(tail))
+        pts = tail.pts()[:, :2]
+        valid = np.isfinite(pts).all(1)
+        pts = np.where(valid[:, None], pts, 0).astype(np.int32).tolist()
         # loop over the set of tracked points
         for i in iterate:
-            # if either of the tracked data are None, ignore them
-            if tail[i - 1] is None or tail[i] is None:
+            # if either of the tracked points are missing, ignore them
+            if not valid[i - 1] or not valid[i]:
                 continue
             # otherwise, compute the thickness of the line and
             # draw the connecting lines
             thickness = int(np.sqrt(old_div(self.tail_len, float(i + 1))) * 2.5)
-            cv2.line(frame, tail[i - 1].pt[:2], tail[i].pt[:2], color, thickness)
+            cv2.line(frame, tuple(pts[i - 1]), tuple(pts[i]), color, thickness)
 
     def draw_stats(self, frame, position=None, fontFace=None, fontScale=None,
                    color=None, thickness=None, tag=None):
@@ -18,7 +18,7 @@ from time import time
 #from RRtoolbox.lib.plotter import fastplt  # DEBUG
 from .core import Space, Group, Agent
 from .periferials import UnifiedCamera, SyncCameras, PiCamera
-from .detectors import Detector
+from .detectors import Detector, FrameContext
 import numpy as np
 from threading import Thread, RLock, Event
 from .forms import EventFigure, pause
@@ -253,7 +253,10 @@ class Scene(Space):
         self.mask = None
         self.areas = Group(_space_parent=self, name="areas")
         self.detectors = Group(_space_parent=self, name="detectors")
-        self.objects = Group(_space_parent=self, name="objects")
+        # iterated by the Scene while the objects are deleted from the
+        # window events
+        self.objects = Group(snapshot=True, _space_parent=self,
+                             name="objects")
         self._stop = True
         self._computed_vis = None
         self._thread = None
@@ -379,12 +382,16 @@ class Scene(Space):
         # process frame
         frame_processed = frame.copy()
 
+        # derived images of the frame shared by all the detectors
+        context = FrameContext(frame)
+
         # tracks all the objects on a unspoiled frame
         for d in self.detectors:
             objs = d._compute_objects(frame, self.mask, _debug_good=frame_processed,
-                               _debug_bad=None)
+                               _debug_bad=None, context=context)
             # add new object to the scene objects' group
-            self.objects.update(objs, as_contained=True)
+            if objs:
+                self.objects.extend_bulk(objs, as_contained=True)
             # draws all the tails on the frame
             for o in d.tracked_objects():
                 o.in_zones = self.get_zones_from_coor(*o.position[:2])
@@ -440,6 +447,9 @@ class Scene(Space):
                 self._thread.join(10)  # this can block forever
                 if self._thread.is_alive():
                     raise Exception("Thread didn't close")
+            # release the threads of the detectors
+            for d in self.detectors:
+                d.close()
 
     def close_window(self):
         if self.view:
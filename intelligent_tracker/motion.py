@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# (C) 2017 David Toro <davsamirtor@gmail.com>
+
+# compatibility with python 2 and 3
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+from builtins import object
+
+# import build-in modules
+
+# import third party modules
+import numpy as np
+
+# special variables
+# __all__ = []
+__author__ = "David Toro"
+# __copyright__ = "Copyright 2017, The <name> Project"
+# __credits__ = [""]
+__license__ = "GPL"
+# __version__ = "1.0.0"
+__maintainer__ = "David Toro"
+__email__ = "davsamirtor@gmail.com"
+# __status__ = "Pre-release"
+
+
+class KalmanMotion(object):
+    """
+    Constant velocity Kalman filter of the points (x, y, z) of an
+    object.
+
+    Each axis is filtered independently with a position and velocity
+    state so that an update only costs a few operations over arrays of
+    3 items, regardless of how many points were given before.
+    """
+
+    def __init__(self, process_noise=1., measurement_noise=4.,
+                 initial_velocity_variance=1e3):
+        """
+        :param process_noise: variance of the acceleration per frame
+        :param measurement_noise: variance of the measured points
+        :param initial_velocity_variance: variance of the velocity
+            before it is observed
+        """
+        self.process_noise = process_noise
+        self.measurement_noise = measurement_noise
+        self.initial_velocity_variance = initial_velocity_variance
+        self.reset()
+
+    def reset(self):
+        """
+        forget all the given points
+        """
+        self.count = 0  # number of points given
+        self._x = np.zeros(3)  # position
+        self._v = np.zeros(3)  # velocity
+        # covariance [[p00, p01], [p01, p11]] of each axis
+        self._p00 = np.zeros(3)
+        self._p01 = np.zeros(3)
+        self._p11 = np.zeros(3)
+
+    def update(self, point, dt=1.):
+        """
+        predict the state dt frames ahead and correct it with a point
+
+        :param point: measured point (x, y, z)
+        :param dt: frames since the last point
+        """
+        z = np.asarray(point, np.float64)
+        r = self.measurement_noise
+        if not self.count:
+            self._x[:] = z
+            self._v[:] = 0
+            self._p00[:] = r
+            self._p01[:] = 0
+            self._p11[:] = self.initial_velocity_variance
+            self.count = 1
+            return
+
+        # predict
+        q = self.process_noise
+        p00, p01, p11 = self._p00, self._p01, self._p11
+        self._x += self._v * dt
+        p00 += dt * (2 * p01 + dt * p11) + q * dt ** 3 / 3.
+        p01 += dt * p11 + q * dt ** 2 / 2.
+        p11 += q * dt
+
+        # correct
+        s = p00 + r
+        k0, k1 = p00 / s, p01 / s
+        y = z - self._x
+        self._x += k0 * y
+        self._v += k1 * y
+        p11 -= k1 * p01
+        p01 *= 1 - k0
+        p00 *= 1 - k0
+        self.count += 1
+
+    @property
+    def position(self):
+        """
+        :return: filtered point (x, y, z)
+        """
+        return self._x.copy()
+
+    @property
+    def velocity(self):
+        """
+        :return: velocity (dx, dy, dz) per frame
+        """
+        return self._v.copy()
+
+    @property
+    def uncertainty(self):
+        """
+        :return: standard deviation of the position in each axis
+        """
+        return np.sqrt(self._p00)
+
+    def predict(self, steps=1.):
+        """
+        :param steps: frames ahead
+        :return: predicted point (x, y, z)
+        """
+        return self._x + self._v * steps
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# (C) 2017 David Toro <davsamirtor@gmail.com>
+
+# compatibility with python 2 and 3
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+from builtins import object
+
+# import build-in modules
+
+# import third party modules
+
+# special variables
+# __all__ = []
+__author__ = "David Toro"
+# __copyright__ = "Copyright 2017, The <name> Project"
+# __credits__ = [""]
+__license__ = "GPL"
+# __version__ = "1.0.0"
+__maintainer__ = "David Toro"
+__email__ = "davsamirtor@gmail.com"
+# __status__ = "Pre-release"
+
+
+class ObjectPool(object):
+    """
+    Pool of retired objects of a Detector so that they are recycled
+    (see Object.recycle) instead of creating new ones.
+
+    Objects must be deleted from the Space before they are released and
+    nothing else should keep them because they will become other
+    objects when acquired again.
+    """
+
+    def __init__(self, max_size=64):
+        """
+        :param max_size: maximum retired objects to keep. None to keep
+            all of them
+        """
+        self.max_size = max_size
+        self._objects = []  # retired objects, last released on top
+        self.hits = 0  # acquisitions served with a retired object
+        self.misses = 0  # acquisitions with an empty pool
+        self.drops = 0  # releases with a full pool
+
+    def __len__(self):
+        return len(self._objects)
+
+    @property
+    def hit_rate(self):
+        """
+        :return: fraction of the acquisitions served by the pool
+        """
+        total = self.hits + self.misses
+        if not total:
+            return 0.
+        return self.hits / total
+
+    def acquire(self):
+        """
+        take a retired object
+
+        :return: object or None if the pool is empty
+        """
+        objects = self._objects
+        if objects:
+            self.hits += 1
+            return objects.pop()
+        self.misses += 1
+        return None
+
+    def release(self, obj):
+        """
+        give a retired object to the pool
+
+        :param obj: object deleted from the Space
+        :return: True if the object was kept, False if the pool is full
+        """
+        objects = self._objects
+        if self.max_size is not None and len(objects) >= self.max_size:
+            self.drops += 1
+            return False
+        objects.append(obj)
+        return True
+
+    def clear(self):
+        """
+        drop all the retired objects
+        """
+        del self._objects[:]
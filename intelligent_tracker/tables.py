@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# (C) 2017 David Toro <davsamirtor@gmail.com>
+
+# compatibility with python 2 and 3
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+from builtins import object
+
+# import build-in modules
+from weakref import ref
+
+# import third party modules
+import numpy as np
+
+# special variables
+# __all__ = []
+__author__ = "David Toro"
+# __copyright__ = "Copyright 2017, The <name> Project"
+# __credits__ = [""]
+__license__ = "GPL"
+# __version__ = "1.0.0"
+__maintainer__ = "David Toro"
+__email__ = "davsamirtor@gmail.com"
+# __status__ = "Pre-release"
+
+
+class TableColumn(object):
+    """
+    Attribute of an object that is kept in a column of the ObjectTable
+    the object is attached to (see ObjectTable.add), or in the object
+    itself if it is not attached to any table.
+    """
+
+    def __init__(self, column, default):
+        """
+        :param column: name of the column in ObjectTable
+        :param default: value of the attribute before it is set
+        """
+        self.column = column
+        self.default = default
+        self.attr = "_own_" + column
+
+    def __get__(self, obj, cls=None):
+        if obj is None:
+            return self
+        table = obj._table
+        if table is None:
+            return getattr(obj, self.attr, self.default)
+        return getattr(table, self.column)[obj._table_row].item()
+
+    def __set__(self, obj, value):
+        table = obj._table
+        if table is None:
+            setattr(obj, self.attr, value)
+        else:
+            getattr(table, self.column)[obj._table_row] = value
+
+
+class ObjectTable(object):
+    """
+    Columnar store of the state of the objects of a Detector so that
+    they can be filtered with vectorized masks.
+
+    Each object takes a row of the table where it keeps its flags
+    (active, tracking, live_forever), stray counters and the last
+    bounding box, point and velocity of its tail. Rows of removed
+    or collected objects are reused.
+    """
+    # column name: (dtype, shape of a row)
+    columns = {
+        "used": (bool, ()),
+        "order": (np.int64, ()),
+        "active": (bool, ()),
+        "tracking": (bool, ()),
+        "live_forever": (bool, ()),
+        "stray": (np.int64, ()),
+        "max_stray": (np.int64, ()),
+        "bbox": (np.float64, (4,)),
+        "pt": (np.float64, (3,)),
+        "velocity": (np.float64, (3,)),
+    }
+
+    def __init__(self, capacity=64):
+        """
+        :param capacity: rows to preallocate
+        """
+        self._objects = []  # weak reference of the object of each row
+        self._free = []  # released rows
+        self._count = 0  # order of the next object
+        for name, (dtype, shape) in self.columns.items():
+            setattr(self, name, np.zeros((max(capacity, 1),) + shape, dtype))
+
+    def __len__(self):
+        return len(self._objects) - len(self._free)
+
+    def _new_row(self):
+        if self._free:
+            return self._free.pop()
+        row = len(self._objects)
+        self._objects.append(None)
+        capacity = len(self.used)
+        if row >= capacity:
+            # double the capacity
+            for name in self.columns:
+                old = getattr(self, name)
+                new = np.zeros((capacity * 2,) + old.shape[1:], old.dtype)
+                new[:capacity] = old
+                setattr(self, name, new)
+        return row
+
+    def add(self, obj):
+        """
+        give a row to an object
+
+        :param obj: object
+        :return: row
+        """
+        row = self._new_row()
+
+        def collected(wr, row=row, selfref=ref(self)):
+            # the object was garbage collected without being removed,
+            # the table is weak not to be in a cycle with its references
+            self = selfref()
+            if self is not None and self._objects[row] is wr:
+                self.release(row)
+
+        self._objects[row] = ref(obj, collected)
+        self.used[row] = True
+        self.order[row] = self._count
+        self._count += 1
+        self.pt[row] = np.nan
+        self.bbox[row] = np.nan
+        self.velocity[row] = 0
+        return row
+
+    def release(self, row):
+        """
+        free the row of an object
+
+        :param row: row
+        """
+        self._objects[row] = None
+        self.used[row] = False
+        self._free.append(row)
+
+    def set_tail_item(self, row, tail_item):
+        """
+        register the last tail item of the object of a row
+
+        :param row: row
+        :param tail_item: TailItem
+        """
+        pt = tail_item.pt_or_nan()
+        last = self.pt[row].copy()
+        self.pt[row] = pt
+        self.bbox[row] = tail_item.bbox
+        velocity = self.pt[row] - last
+        self.velocity[row] = np.where(np.isfinite(velocity), velocity, 0)
+
+    def select(self, mask=None):
+        """
+        get the objects of the rows in a mask
+
+        :param mask: boolean array over the rows. If None all the objects
+        :return: list of objects in the order they were added
+        """
+        n = len(self._objects)
+        used = self.used[:n]
+        if mask is not None:
+            used = used & mask[:n]
+        rows = np.flatnonzero(used)
+        rows = rows[np.argsort(self.order[rows], kind="mergesort")]
+        objects = (self._objects[i]() for i in rows)
+        return [o for o in objects if o is not None]
+
+    def stray_mask(self):
+        """
+        :return: mask of the active objects that are missing their target
+        """
+        return (self.active & ~self.live_forever &
+                (self.stray > self.max_stray))
@@ -0,0 +1,265 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# (C) 2017 David Toro <davsamirtor@gmail.com>
+
+# compatibility with python 2 and 3
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+from builtins import object
+
+# import build-in modules
+from multiprocessing.pool import ThreadPool
+
+# import third party modules
+from .core import cv_major_ver
+import numpy as np
+import cv2
+
+# special variables
+# __all__ = []
+__author__ = "David Toro"
+# __copyright__ = "Copyright 2017, The <name> Project"
+# __credits__ = [""]
+__license__ = "GPL"
+# __version__ = "1.0.0"
+__maintainer__ = "David Toro"
+__email__ = "davsamirtor@gmail.com"
+# __status__ = "Pre-release"
+
+
+def create_tracker(tracker_type='MEDIANFLOW'):
+    """
+    create an OpenCV tracker
+
+    :param tracker_type: 'BOOSTING', 'MIL', 'KCF', 'TLD', 'MEDIANFLOW'
+        or 'GOTURN'
+    :return: cv2 tracker
+    """
+    tk_name = tracker_type.upper()
+    if int(cv_major_ver) < 3:
+        tracker = cv2.Tracker_create(tk_name)
+    elif tk_name == 'BOOSTING':
+        tracker = cv2.TrackerBoosting_create()
+    elif tk_name == 'MIL':
+        tracker = cv2.TrackerMIL_create()
+    elif tk_name == 'KCF':
+        tracker = cv2.TrackerKCF_create()
+    elif tk_name == 'TLD':
+        tracker = cv2.TrackerTLD_create()
+    elif tk_name == 'MEDIANFLOW':
+        tracker = cv2.TrackerMedianFlow_create()
+    elif tk_name == 'GOTURN':
+        tracker = cv2.TrackerGOTURN_create()
+    else:
+        raise ValueError("tracker_type not supported")
+    return tracker
+
+
+class TrackerBackend(object):
+    """
+    Backend to track all the objects of a Detector in one call.
+
+    This backend gives each object its own OpenCV tracker (kept in
+    Object.tracker) and updates them one after another. When an object
+    is corrected its tracker is initialized again in place if the
+    tracker type supports it, otherwise a new tracker is created. The
+    legacy OpenCV trackers (e.g. MEDIANFLOW in OpenCV 4) can only be
+    initialized once.
+    """
+    # tracker types and whether they can be initialized again, probed
+    # once per process
+    _reinit_types = {}
+
+    def __init__(self, reuse=True):
+        """
+        :param reuse: True to re-initialize the trackers of the objects
+            instead of creating new ones
+        """
+        self.reuse = reuse
+        self.creations = 0  # trackers created
+        self.reuses = 0  # trackers initialized again
+
+    @classmethod
+    def can_reinit(cls, tracker_type):
+        """
+        check whether trackers of a type can be initialized again by
+        probing a tracker of that type the first time it is asked
+
+        :param tracker_type: type of the OpenCV tracker
+        :return: True if the trackers can be initialized again
+        """
+        tk_name = tracker_type.upper()
+        can = cls._reinit_types.get(tk_name)
+        if can is None:
+            rand = np.random.RandomState(0)
+            frame = rand.randint(0, 255, (64, 64, 3)).astype(np.uint8)
+            tracker = create_tracker(tk_name)
+            if tracker.init(frame, (16, 16, 32, 32)) is False:
+                # the probe did not start, it does not tell anything
+                return False
+            # new OpenCV trackers return None and the legacy ones
+            # return False if they were already initialized
+            can = tracker.init(frame, (18, 16, 32, 32)) is not False
+            cls._reinit_types[tk_name] = can
+        return can
+
+    def init(self, obj, frame, bbox, tracker_type=None):
+        """
+        (re)start tracking an object
+
+        :param obj: Object
+        :param frame: frame where the object is
+        :param bbox: bounding box of the object in frame
+        :param tracker_type: type of the OpenCV tracker. If None it is
+            obj.tracker_type
+        :return: True if the object is being tracked
+        """
+        if tracker_type is None:
+            tracker_type = obj.tracker_type
+        tracker = obj.tracker
+        if (self.reuse and tracker is not None and
+                obj.tracker_type.upper() == tracker_type.upper() and
+                self.can_reinit(tracker_type)):
+            if tracker.init(frame, bbox) is not False:
+                self.reuses += 1
+                obj.tracker_type = tracker_type
+                return True
+            # only this initialization failed, a new tracker is tried
+
+        tracker = create_tracker(tracker_type)
+        self.creations += 1
+        obj.tracker_type = tracker_type
+        obj.tracker = tracker
+        # new OpenCV trackers return None and raise on failure
+        return tracker.init(frame, bbox) is not False
+
+    def reset(self, obj):
+        """
+        forget what was tracked of an object that is recycled as a new
+        one. The tracker is kept to be initialized again.
+
+        :param obj: Object
+        """
+        return
+
+    def _update(self, obj, frame):
+        return obj.tracker.update(frame)
+
+    def update(self, objects, frame):
+        """
+        track objects in a new frame
+
+        :param objects: list of objects started with init
+        :param frame: new frame
+        :return: list of (is_tracking, bbox) in the order of objects
+        """
+        return [self._update(o, frame) for o in objects]
+
+    def close(self):
+        """
+        release the resources of the backend
+        """
+        return
+
+
+class ThreadTrackerBackend(TrackerBackend):
+    """
+    Backend that updates the OpenCV trackers of the objects in a pool
+    of threads because OpenCV releases the GIL while tracking.
+    """
+
+    def __init__(self, processes=None, reuse=True):
+        """
+        :param processes: number of threads. If None it is the number
+            of CPUs, if 1 the objects are updated in the calling thread.
+        :param reuse: True to re-initialize the trackers of the objects
+            instead of creating new ones
+        """
+        super(ThreadTrackerBackend, self).__init__(reuse)
+        self.processes = processes
+        self._pool = None
+
+    def update(self, objects, frame):
+        objects = list(objects)
+        if self.processes == 1 or len(objects) <= 1:
+            return super(ThreadTrackerBackend, self).update(objects, frame)
+        if self._pool is None:
+            self._pool = ThreadPool(self.processes)
+        # map keeps the order of the objects
+        return self._pool.map(lambda o: self._update(o, frame), objects)
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+
+class PredictionState(object):
+    """
+    State of an object tracked by a PredictionTrackerBackend
+    """
+    __slots__ = ("bbox", "velocity", "corrected", "misses")
+
+    def __init__(self, bbox, velocity=(0., 0.)):
+        self.bbox = np.array(bbox, np.float64)  # predicted bounding box
+        self.velocity = np.array(velocity, np.float64)  # pixels per frame
+        self.corrected = self.bbox.copy()  # last bounding box given to init
+        self.misses = 0  # frames since the last correction
+
+
+class PredictionTrackerBackend(TrackerBackend):
+    """
+    Backend that does not look at the frames. It moves the bounding
+    boxes of all the objects at once with the constant velocity observed
+    between their last corrections (each call to init), so that the
+    detections are the ones that really follow the objects.
+
+    An object stops tracking when it goes more than max_predictions
+    frames without a correction.
+    """
+
+    def __init__(self, max_predictions=5):
+        """
+        :param max_predictions: maximum frames to predict without
+            correction
+        """
+        super(PredictionTrackerBackend, self).__init__()
+        self.max_predictions = max_predictions
+
+    def init(self, obj, frame, bbox, tracker_type=None):
+        state = obj.tracker
+        if isinstance(state, PredictionState):
+            # velocity from the previous correction
+            bbox = np.array(bbox, np.float64)
+            steps = max(state.misses, 1)
+            state.velocity = (bbox[:2] - state.corrected[:2]) / steps
+            state.bbox, state.corrected, state.misses = bbox, bbox.copy(), 0
+            self.reuses += 1
+        else:
+            obj.tracker = PredictionState(bbox)
+            self.creations += 1
+        return True
+
+    def reset(self, obj):
+        # the velocity must not come from the previous object
+        obj.tracker = None
+
+    def update(self, objects, frame):
+        states = [o.tracker for o in objects]
+        if not states:
+            return []
+        bboxes = np.array([s.bbox for s in states])
+        velocities = np.array([s.velocity for s in states])
+        misses = np.array([s.misses for s in states]) + 1
+        bboxes[:, :2] += velocities
+        for s, bbox, miss in zip(states, bboxes, misses):
+            s.bbox, s.misses = bbox, miss
+        is_tracking = misses <= self.max_predictions
+        return [(bool(ok), tuple(bbox))
+                for ok, bbox in zip(is_tracking, bboxes)]
+
+
+# backend of objects without a Detector
+default_backend = TrackerBackend()
@@ -0,0 +1,37 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# (C) 2017 David Toro <davsamirtor@gmail.com>
+"""
+detectors and frames shared by the tests
+"""
+# compatibility with python 2 and 3
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+from builtins import object
+
+# import third party modules
+import numpy as np
+import cv2
+
+# special variables
+#__all__ = []
+__author__ = "David Toro"
+#__copyright__ = "Copyright 2017, The <name> Project"
+#__credits__ = [""]
+__license__ = "GPL"
+#__version__ = "1.0.0"
+__maintainer__ = "David Toro"
+__email__ = "davsamirtor@gmail.com"
+#__status__ = "Pre-release"
+
+from intelligent_tracker.detectors import Detector
+
+
+class SquareDetector(Detector):
+    """detect bright regions"""
+    def detect_raw_objects(self, frame, mask=None):
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        return cv2.findContours((gray > 127).astype(np.uint8),
+                                cv2.RETR_EXTERNAL,
+                                cv2.CHAIN_APPROX_SIMPLE)[-2]
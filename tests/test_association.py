@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# (C) 2017 David Toro <davsamirtor@gmail.com>
+
+# compatibility with python 2 and 3
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+from builtins import object
+
+# import build-in modules
+import sys
+from time import time
+
+# import third party modules
+import numpy as np
+
+# special variables
+#__all__ = []
+__author__ = "David Toro"
+#__copyright__ = "Copyright 2017, The <name> Project"
+#__credits__ = [""]
+__license__ = "GPL"
+#__version__ = "1.0.0"
+__maintainer__ = "David Toro"
+__email__ = "davsamirtor@gmail.com"
+#__status__ = "Pre-release"
+
+import unittest
+from intelligent_tracker.core import TailItem
+from intelligent_tracker.association import (Association, GridAssociation,
+                                             associate)
+
+
+def random_tail_items(no_items, shape=(1080, 1920), max_size=80, seed=None):
+    """create tail items with random rotated boxes inside shape"""
+    rand = np.random.RandomState(seed)
+    h, w = shape
+    items = []
+    for _ in range(no_items):
+        sz_x, sz_y = rand.randint(4, max_size, 2)
+        cx, cy = rand.randint(0, w), rand.randint(0, h)
+        angle = rand.choice([0, 20, 40, -20, -40])
+        items.append(TailItem(rbox=((cx, cy), (sz_x, sz_y), angle)))
+    return items
+
+
+class AssociationTestCase(unittest.TestCase):
+    def setUp(self):
+        "Hook method for setting up the test fixture before exercising it."
+        self.engines = [Association(), GridAssociation(),
+                        GridAssociation(cell_size=16)]
+
+    def tearDown(self):
+        "Hook method for deconstructing the test fixture after testing it."
+        pass
+
+    def test_same_classification(self):
+        """test that all engines classify as the brute force engine"""
+        for no_objects in (0, 1, 10, 200):
+            objects = random_tail_items(no_objects, seed=no_objects)
+            detections = random_tail_items(100, seed=no_objects + 1)
+            # detections over the objects
+            detections.extend(TailItem(rbox=((o.rbox[0][0] + 3, o.rbox[0][1]),
+                                             o.rbox[1], o.rbox[2]))
+                              for o in objects[:20])
+            expected = None
+            for engine in self.engines:
+                engine.build(objects, objects)
+                ans = associate(engine, detections)
+                if expected is None:
+                    expected = ans
+                with self.subTest(engine=engine.__class__.__name__,
+                                  no_objects=no_objects):
+                    self.assertEqual(ans, expected)
+
+    def test_compare(self):
+        """
+        benchmark association of 100 detections with an increasing
+        number of objects
+        """
+        detections = random_tail_items(100, seed=0)
+        for no_objects in (10, 100, 500, 2000):
+            objects = random_tail_items(no_objects, seed=no_objects)
+            results = []
+            for engine in self.engines[:2]:
+                t = time()
+                engine.build(objects, objects)
+                results.append(associate(engine, detections))
+                print("associating {} detections with {} objects using {}: "
+                      "{:.6f} seconds".format(len(detections), no_objects,
+                                              engine.__class__.__name__,
+                                              time() - t))
+            self.assertEqual(results[0], results[1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# (C) 2017 David Toro <davsamirtor@gmail.com>
+
+# compatibility with python 2 and 3
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+from builtins import object
+
+# import build-in modules
+import sys
+
+# import third party modules
+import numpy as np
+
+# special variables
+#__all__ = []
+__author__ = "David Toro"
+#__copyright__ = "Copyright 2017, The <name> Project"
+#__credits__ = [""]
+__license__ = "GPL"
+#__version__ = "1.0.0"
+__maintainer__ = "David Toro"
+__email__ = "davsamirtor@gmail.com"
+#__status__ = "Pre-release"
+
+import unittest
+from intelligent_tracker.motion import KalmanMotion
+from intelligent_tracker.detectors import Detector, Object
+
+
+class KalmanMotionTestCase(unittest.TestCase):
+
+    def test_constant_velocity(self):
+        """test the filter follows an object with constant velocity"""
+        rand = np.random.RandomState(0)
+        motion = KalmanMotion()
+        uncertainty = []
+        for i in range(50):
+            point = np.array((10 + 3 * i, 200 - 2 * i, 100)) + rand.randn(3)
+            motion.update(point)
+            uncertainty.append(motion.uncertainty)
+        self.assertEqual(motion.count, 50)
+        self.assertTrue(np.allclose(motion.velocity, (3, -2, 0), atol=0.5))
+        self.assertTrue(np.allclose(motion.predict(), (160, 100, 100), atol=2))
+        self.assertTrue(np.all(uncertainty[-1] < uncertainty[1]))
+        motion.reset()
+        self.assertEqual(motion.count, 0)
+
+    def test_object(self):
+        """test objects use the motion model of their detector"""
+        detector = Detector()
+        detector.motion_model = KalmanMotion
+        frame = np.zeros((240, 320, 3), np.uint8)
+        o = Object(frame=frame, parent_detector=detector,
+                   bbox=(10, 100, 20, 20))
+        self.assertIsNotNone(o.motion)
+        self.assertEqual(o.dX, None)
+        for i in range(1, 20):
+            o.add_to_tail(bbox=(10 + 4 * i, 100 - i, 20, 20))
+        o.compute()
+        self.assertTrue(o.dX > 0 and o.dY < 0)
+        self.assertEqual(o.direction(), "right-up-")
+        x, y, w, h = o.predicted_bbox()
+        self.assertAlmostEqual(x, 90, delta=1)
+        self.assertAlmostEqual(y, 80, delta=1)
+        x0, y0, x1, y1 = detector.object_region(o, frame.shape)
+        self.assertTrue(x0 < 86 and x1 > 110)
+
+    def test_zero_area(self):
+        """test contours without area do not correct the motion model"""
+        from io import StringIO
+        from contextlib import redirect_stdout
+        detector = Detector()
+        detector.motion_model = KalmanMotion
+        frame = np.zeros((240, 320, 3), np.uint8)
+        line = np.array([[[0, 0]], [[10, 0]], [[20, 0]]], np.int32)
+        out = StringIO()
+        with redirect_stdout(out):
+            o = Object(frame=frame, parent_detector=detector,
+                       bbox=(10, 100, 20, 20))
+            o.add_to_tail(cnt=line)
+            self.assertEqual(o.motion.count, 1)
+            # tracking again keeps only the last item and its time
+            times = o.tail.times()
+            o.is_tracking = False
+            o.is_tracking = True
+            self.assertEqual(o.motion.count, 0)
+            self.assertEqual(o.tail.times().tolist(), times[:1].tolist())
+        self.assertEqual(out.getvalue(), "")
+
+    def test_max_tail_len(self):
+        """test the times of the tail are kept when it is resized"""
+        frame = np.zeros((240, 320, 3), np.uint8)
+        o = Object(frame=frame, parent_detector=Detector(),
+                   bbox=(10, 100, 20, 20))
+        for i in range(1, 25):
+            o.add_to_tail(bbox=(10 + i, 100, 20, 20))
+        times = o.tail.times()
+        o.max_tail_len = 40
+        self.assertEqual(o.tail.times().tolist(), times.tolist())
+
+
+
+if __name__ == "__main__":
+    unittest.main()
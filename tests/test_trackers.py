@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# (C) 2017 David Toro <davsamirtor@gmail.com>
+
+# compatibility with python 2 and 3
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+from builtins import object
+
+# import build-in modules
+import sys
+
+# import third party modules
+import numpy as np
+
+# special variables
+#__all__ = []
+__author__ = "David Toro"
+#__copyright__ = "Copyright 2017, The <name> Project"
+#__credits__ = [""]
+__license__ = "GPL"
+#__version__ = "1.0.0"
+__maintainer__ = "David Toro"
+__email__ = "davsamirtor@gmail.com"
+#__status__ = "Pre-release"
+
+import unittest
+from intelligent_tracker.detectors import Detector, Object
+from intelligent_tracker.trackers import (TrackerBackend, ThreadTrackerBackend,
+                                          PredictionTrackerBackend)
+
+
+def textured_frame(positions, shape=(240, 320), size=40, seed=0):
+    """create a frame with textured squares at positions"""
+    rand = np.random.RandomState(seed)
+    frame = np.zeros(shape + (3,), np.uint8)
+    for x, y in positions:
+        frame[y:y + size, x:x + size] = rand.randint(0, 255, (size, size, 3))
+    return frame
+
+
+class TrackerBackendTestCase(unittest.TestCase):
+
+    def setUp(self):
+        "Hook method for setting up the test fixture before exercising it."
+        self.positions = [(20, 20), (120, 40), (220, 150), (60, 160)]
+
+    def track(self, backend, frames=5):
+        detector = Detector()
+        detector.tracker_backend = backend
+        frame = textured_frame(self.positions)
+        for x, y in self.positions:
+            o = Object(frame=frame, parent_detector=detector,
+                       bbox=(x, y, 40, 40))
+            detector.objects.add_as_contained(o)
+        for i in range(1, frames + 1):
+            frame = textured_frame([(x + 2 * i, y + i)
+                                    for x, y in self.positions])
+            detector.track_objects(frame)
+        backend.close()
+        return [(o.is_tracking, o.tail[0].bbox) for o in detector.objects]
+
+    def test_same_tracking(self):
+        """test threads track as the serial backend"""
+        serial = self.track(TrackerBackend())
+        threaded = self.track(ThreadTrackerBackend(4))
+        self.assertEqual(serial, threaded)
+
+    def test_prediction(self):
+        """test objects are moved with the velocity of the corrections"""
+        backend = PredictionTrackerBackend(max_predictions=2)
+        frame = textured_frame([])
+        o = Object(frame=frame, parent_detector=None, bbox=(10, 10, 20, 20))
+        self.assertEqual(o.tracker_backend().__class__, TrackerBackend)
+        backend.init(o, frame, (10, 10, 20, 20))
+        backend.update([o], frame)
+        backend.init(o, frame, (14, 12, 20, 20))
+        self.assertEqual(backend.update([o], frame),
+                         [(True, (18., 14., 20., 20.))])
+        backend.update([o], frame)
+        self.assertEqual(backend.update([o], frame),
+                         [(False, (26., 18., 20., 20.))])
+        self.assertEqual(backend.update([], frame), [])
+        self.assertEqual((backend.creations, backend.reuses), (1, 1))
+
+    def test_reuse(self):
+        """test trackers are initialized again instead of created"""
+        frame = textured_frame(self.positions)
+        for tracker_type in ("MEDIANFLOW", "KCF"):
+            backend = TrackerBackend()
+            o = Object(frame=frame, parent_detector=None, bbox=(20, 20, 40, 40),
+                       tracker_type=tracker_type)
+            for i in range(5):
+                self.assertTrue(backend.init(o, frame, (20 + i, 20, 40, 40)))
+            with self.subTest(tracker_type=tracker_type):
+                self.assertEqual(backend.creations + backend.reuses, 5)
+                if TrackerBackend.can_reinit(tracker_type):
+                    # initialized in place
+                    self.assertEqual(backend.creations, 0)
+                else:
+                    # trackers that can only be initialized once are
+                    # created every time
+                    self.assertEqual(backend.reuses, 0)
+
+    def test_failed_init(self):
+        """test a failed initialization does not stop the reuse"""
+        class FailingTracker(object):
+            def init(self, frame, bbox):
+                return False
+        frame = textured_frame(self.positions)
+        backend = TrackerBackend()
+        o = Object(frame=frame, parent_detector=None, bbox=(20, 20, 40, 40),
+                   tracker_type="KCF")
+        self.assertTrue(TrackerBackend.can_reinit("KCF"))
+        o.tracker = FailingTracker()
+        self.assertTrue(backend.init(o, frame, (20, 20, 40, 40)))
+        self.assertEqual((backend.creations, backend.reuses), (1, 0))
+        self.assertTrue(backend.init(o, frame, (22, 20, 40, 40)))
+        self.assertEqual((backend.creations, backend.reuses), (1, 1))
+        self.assertTrue(TrackerBackend.can_reinit("KCF"))
+
+
+if __name__ == "__main__":
+    unittest.main()